@@ -0,0 +1,210 @@
+"""
+End-to-end benchmark for the cold emailing tool, without spending real API money.
+
+Starts a local stand-in for the Scrapin and OpenAI APIs (mock_servers.MockAPIServer), runs N synthetic
+prospects through the batch pipeline (webscrape -> get_person -> prompt selection -> compose_message ->
+null delivery) and reports prospects/minute, per-stage latency and peak memory.
+
+    python benchmark.py --prospects 200 --concurrency 16 --error-rate 0.01 --rate-limit-rate 0.05
+"""
+from contextlib import redirect_stdout
+from mock_servers import MockAPIServer
+from cache import PersistentCache
+from companies import CompanyKnowledgeBase
+from suppression import SuppressionIndex
+from clients import APIClients, Hedger
+from email_patterns import PatternIndex
+from tracing import percentile
+import tracemalloc
+import argparse
+import tempfile
+import asyncio
+import json
+import time
+import sys
+import os
+
+import main
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixture(name):
+    """
+    Load a JSON fixture from the fixtures directory.
+    """
+    with open(os.path.join(FIXTURE_DIR, name), 'r') as file:
+        return json.load(file)
+
+
+def configure(server, work_dir, args):
+    """
+    Point the tool at the mock server, with fresh caches in `work_dir` and the null delivery backend.
+    """
+    os.environ['OPENAI'] = 'mock-openai-key'
+    os.environ['SCRAPIN'] = 'mock-scrapin-key'
+    main.SCRAPIN_BASE_URL = server.url
+    limits = {}
+    if args.rate_limits:
+        limits = dict(
+            openai_rpm=main.OPENAI_REQUESTS_PER_MINUTE,
+            openai_tpm=main.OPENAI_TOKENS_PER_MINUTE,
+            scrapin_rpm=main.SCRAPIN_REQUESTS_PER_MINUTE,
+        )
+    main.CLIENTS = APIClients(
+        max_retries=main.API_MAX_RETRIES,
+        pool_size=main.HTTP_POOL_SIZE,
+        openai_base_url=server.url + '/v1',
+        hedger=Hedger(main.HEDGE_PERCENTILE, max_fraction=main.HEDGE_MAX_FRACTION) if args.hedge else None,
+        hedge_models={main.SIMPLE_MODEL},
+        **limits
+    )
+    cache_path = os.path.join(work_dir, main.CACHE_DB)
+    main.SCRAPE_CACHE = PersistentCache(cache_path, 'scrapin_responses',
+                                        max_entries=main.SCRAPE_CACHE_MAX_ENTRIES, ttls=main.SCRAPE_CACHE_TTLS)
+    main.LLM_CACHE = PersistentCache(cache_path, 'llm_lookups',
+                                     max_entries=main.LLM_CACHE_MAX_ENTRIES, ttls=main.LLM_CACHE_TTLS)
+    main.COMPANIES = CompanyKnowledgeBase(cache_path, 'companies', ttl=main.COMPANY_KB_TTL)
+    main.SUPPRESSION = SuppressionIndex(os.path.join(work_dir, main.SUPPRESSION_FILE))
+    main.EMAIL_PATTERN_INDEX = PatternIndex(os.path.join(work_dir, main.EMAIL_PATTERN_FILE))
+    main.close_delivery_backend()
+    main.DELIVERY_BACKEND = 'null'
+    main.STREAM_COMPOSE = args.stream
+    main.PROFILE_ANALYSIS = args.profile_analysis
+    main.TRACER.reset()
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB, or None where the resource module is unavailable.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run(args):
+    """
+    Run the benchmark and return its results as a dict.
+    """
+    latencies = {kind: mean * args.latency_scale
+                 for kind, mean in {'profile': 0.5, 'company': 0.3, 'chat': 0.4, 'compose': 3.0}.items()}
+    for override in args.latency or []:
+        kind, _, value = override.partition('=')
+        latencies[kind] = float(value)
+    server = MockAPIServer(
+        load_fixture('scrapin_profiles.json'),
+        load_fixture('scrapin_company.json'),
+        companies=args.companies or max(1, args.prospects // 4),
+        latencies=latencies,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    stage_limits = main.parse_stage_limits(args.stage_limit, args.concurrency)
+    urls = [f"https://www.linkedin.com/in/prospect-{index}" for index in range(args.prospects)]
+    with server, tempfile.TemporaryDirectory() as work_dir:
+        configure(server, work_dir, args)
+        if args.trace_memory:
+            tracemalloc.start()
+        output_path = os.path.join(work_dir, 'results.jsonl')
+        start = time.monotonic()
+        with open(os.devnull, 'w') as devnull, redirect_stdout(sys.stdout if args.verbose else devnull):
+            statuses = asyncio.run(main.run_batch(urls, output_path, stage_limits, send=True))
+        elapsed = time.monotonic() - start
+        peak_python = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if args.trace_memory else None
+        if args.trace_memory:
+            tracemalloc.stop()
+        requests = dict(server.requests)
+    return {
+        "prospects": args.prospects,
+        "stage_limits": stage_limits,
+        "elapsed_seconds": round(elapsed, 3),
+        "prospects_per_minute": round(args.prospects / elapsed * 60, 2),
+        "statuses": dict(statuses),
+        "stages": {
+            stage: {
+                "calls": len(durations),
+                "p50": round(percentile(durations, 50), 4),
+                "p95": round(percentile(durations, 95), 4),
+            }
+            for stage, durations in sorted(main.TRACER.durations.items())
+        },
+        "mock_requests": requests,
+        "peak_rss_mb": round(peak_rss_mb(), 1) if peak_rss_mb() is not None else None,
+        "peak_python_mb": round(peak_python, 1) if peak_python is not None else None,
+    }
+
+
+def report(results):
+    """
+    Print the benchmark results as a table.
+    """
+    print(f"\n{results['prospects']} prospects in {results['elapsed_seconds']:.1f}s "
+          f"-> {results['prospects_per_minute']:.1f} prospects/minute")
+    print("Statuses: " + ", ".join(f"{status}: {count}" for status, count in results['statuses'].items()))
+    print("Mock API requests: " + ", ".join(f"{kind}: {count}" for kind, count in sorted(results['mock_requests'].items())))
+    memory = f"Peak RSS: {results['peak_rss_mb']} MB"
+    if results['peak_python_mb'] is not None:
+        memory += f", peak Python heap: {results['peak_python_mb']} MB"
+    print(memory)
+    print(f"\n{'Stage':<22}{'Calls':>7}{'p50 (s)':>10}{'p95 (s)':>10}")
+    for stage, stats in results['stages'].items():
+        print(f"{stage:<22}{stats['calls']:>7}{stats['p50']:>10.3f}{stats['p95']:>10.3f}")
+
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="End-to-end benchmark against local mock Scrapin and OpenAI servers")
+    parser.add_argument('--prospects', type=int, default=100, help="Number of synthetic prospects")
+    parser.add_argument('--companies', type=int,
+                        help="Distinct employers among the prospects (default: a quarter of --prospects)")
+    parser.add_argument('--concurrency', type=int, help="In-flight prospects for every stage except send")
+    parser.add_argument('--stage-limit', action='append', metavar='STAGE=N', help="In-flight prospects for one stage")
+    parser.add_argument('--latency-scale', type=float, default=1.0,
+                        help="Multiply the default mean latencies (profile 0.5s, company 0.3s, chat 0.4s, compose 3s)")
+    parser.add_argument('--latency', action='append', metavar='KIND=SECONDS',
+                        help="Mean latency for one request kind (profile, company, chat, compose)")
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help="Spread of the log-normal latencies")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests that fail with 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Share of requests that fail with 429")
+    parser.add_argument('--rate-limits', action='store_true',
+                        help="Apply the configured OpenAI/Scrapin rate limits (off by default)")
+    parser.add_argument('--stream', action='store_true', help="Stream email composition")
+    parser.add_argument('--profile-analysis', action='store_true', help="Use the single-request profile analysis")
+    parser.add_argument('--hedge', action='store_true', help="Hedge Scrapin and SIMPLE_MODEL requests slower than p95")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the mock latencies and errors")
+    parser.add_argument('--trace-memory', action='store_true', help="Also measure the peak Python heap (slower)")
+    parser.add_argument('--verbose', action='store_true', help="Show the tool's own output")
+    parser.add_argument('--json', metavar='FILE', help="Write the results to FILE as JSON")
+    parser.add_argument('--baseline', metavar='FILE',
+                        help="Results JSON of an earlier run; exit with status 1 if throughput regressed")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="Allowed throughput drop relative to --baseline (default 0.1 = 10%%)")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = run(args)
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        floor = baseline["prospects_per_minute"] * (1 - args.tolerance)
+        if results["prospects_per_minute"] < floor:
+            print(f"\nRegression: {results['prospects_per_minute']:.1f} prospects/minute is below "
+                  f"{floor:.1f} (baseline {baseline['prospects_per_minute']:.1f} - {args.tolerance:.0%}).")
+            sys.exit(1)
+        print(f"\nNo regression against baseline ({baseline['prospects_per_minute']:.1f} prospects/minute).")
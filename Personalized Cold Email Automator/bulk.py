@@ -0,0 +1,144 @@
+import shutil
+import json
+import time
+import uuid
+import os
+
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+def write_batch_requests(path, requests_by_id):
+    """
+    Write chat completion request bodies to a Batch API input file (one JSON request per line).
+    `requests_by_id` maps each custom_id to its request body.
+    """
+    with open(path, 'w') as file:
+        for custom_id, body in requests_by_id.items():
+            line = {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+            file.write(json.dumps(line) + "\n")
+
+
+def parse_batch_output(lines):
+    """
+    Map each custom_id in Batch API output lines to the message content, or to None if the request failed.
+    """
+    results = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        response = item.get("response") or {}
+        content = None
+        if not item.get("error") and response.get("status_code") == 200:
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                content = None
+        results[item.get("custom_id")] = content
+    return results
+
+
+class OpenAIBatchBackend:
+    """
+    Submits batch input files to the OpenAI Batch API and downloads their results.
+    """
+    name = 'openai'
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, path):
+        """
+        Upload the input file, create the batch and return its job id.
+        """
+        with open(path, 'rb') as file:
+            uploaded = self.client.files.create(file=file, purpose='batch')
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT, completion_window='24h'
+        )
+        return batch.id
+
+    def status(self, job_id):
+        """
+        Return the status of the batch (e.g. 'in_progress', 'completed', 'failed').
+        """
+        return self.client.batches.retrieve(job_id).status
+
+    def results(self, job_id):
+        """
+        Return the output lines of a completed batch (failed requests included).
+        """
+        batch = self.client.batches.retrieve(job_id)
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines.extend(self.client.files.content(file_id).text.splitlines())
+        return lines
+
+
+def local_draft(body):
+    """
+    Default responder for LocalBatchBackend: a short, deterministic placeholder draft.
+    """
+    return "Hi there,\n\nThis draft was written offline by the local batch stand-in.\n\nWarmly,\nJane"
+
+
+class LocalBatchBackend:
+    """
+    An on-disk stand-in for the OpenAI Batch API, so the bulk flow can be tested offline.
+    Jobs are answered by `responder(request_body) -> str` and complete `delay` seconds after submission.
+    """
+    name = 'local'
+
+    def __init__(self, directory, responder=None, delay=0):
+        self.directory = directory
+        self.responder = responder or local_draft
+        self.delay = delay
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id, suffix):
+        return os.path.join(self.directory, f"{job_id}.{suffix}")
+
+    def submit(self, path):
+        """
+        Copy the input file into the job directory and return a new job id.
+        """
+        job_id = f"localbatch_{uuid.uuid4().hex[:12]}"
+        shutil.copyfile(path, self._path(job_id, 'input.jsonl'))
+        with open(self._path(job_id, 'meta.json'), 'w') as file:
+            json.dump({"created_at": time.time()}, file)
+        return job_id
+
+    def status(self, job_id):
+        """
+        Return 'in_progress' until the delay has passed, then 'completed'.
+        """
+        if not os.path.exists(self._path(job_id, 'meta.json')):
+            return 'failed'
+        with open(self._path(job_id, 'meta.json'), 'r') as file:
+            created_at = json.load(file)["created_at"]
+        return 'completed' if time.time() - created_at >= self.delay else 'in_progress'
+
+    def results(self, job_id):
+        """
+        Answer every request of the job in Batch API output format.
+        """
+        lines = []
+        with open(self._path(job_id, 'input.jsonl'), 'r') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                content = self.responder(request["body"])
+                lines.append(json.dumps({
+                    "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                    "custom_id": request["custom_id"],
+                    "response": {
+                        "status_code": 200,
+                        "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]},
+                    },
+                    "error": None,
+                }))
+        return lines
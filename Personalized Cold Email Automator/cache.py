@@ -0,0 +1,110 @@
+from collections import Counter
+from tracing import TRACER
+import threading
+import sqlite3
+import json
+import time
+
+
+class PersistentCache:
+    """
+    A small SQLite-backed key/value store with per-kind TTLs and LRU eviction.
+    Values are stored as JSON, so anything json.dumps accepts can be cached (except None,
+    which get() uses to signal a miss). One instance can be shared between threads.
+    """
+    def __init__(self, path, table, max_entries=10000, ttls=None):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.ttls = ttls or {}          # kind -> seconds; kinds without a TTL never expire
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        """
+        Open the database on first use and create the table if needed. Caller must hold the lock.
+        """
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (kind, key))"
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, kind, key):
+        """
+        Return the cached value for (kind, key), or None if it is missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connection()
+                row = conn.execute(
+                    f"SELECT value, created_at FROM {self.table} WHERE kind = ? AND key = ?", (kind, key)
+                ).fetchone()
+                ttl = self.ttls.get(kind)
+                if row is None or (ttl is not None and now - row[1] > ttl):
+                    if row is not None:
+                        conn.execute(f"DELETE FROM {self.table} WHERE kind = ? AND key = ?", (kind, key))
+                        conn.commit()
+                    self.misses[kind] += 1
+                    TRACER.count(f"cache_miss:{self.table}:{kind}")
+                    return None
+                conn.execute(
+                    f"UPDATE {self.table} SET accessed_at = ? WHERE kind = ? AND key = ?", (now, kind, key)
+                )
+                conn.commit()
+                self.hits[kind] += 1
+                TRACER.count(f"cache_hit:{self.table}:{kind}")
+                return json.loads(row[0])
+            except (sqlite3.Error, ValueError) as e:
+                print(f"Error reading from cache {self.table}: {e}")
+                self.misses[kind] += 1
+                return None
+
+    def set(self, kind, key, value):
+        """
+        Store a value for (kind, key) and evict the least recently used entries above max_entries.
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (kind, key, value, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (kind, key, json.dumps(value), now, now)
+                )
+                excess = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    conn.execute(
+                        f"DELETE FROM {self.table} WHERE rowid IN "
+                        f"(SELECT rowid FROM {self.table} ORDER BY accessed_at LIMIT ?)", (excess,)
+                    )
+                conn.commit()
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                print(f"Error writing to cache {self.table}: {e}")
+
+    def stats(self):
+        """
+        Return hit/miss counters per kind.
+        """
+        kinds = sorted(set(self.hits) | set(self.misses))
+        return {kind: {"hits": self.hits[kind], "misses": self.misses[kind]} for kind in kinds}
+
+    def close(self):
+        """
+        Close the underlying database connection.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
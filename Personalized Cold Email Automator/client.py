@@ -0,0 +1,94 @@
+"""
+Thin command line client for the warm daemon (daemon.py).
+
+Sends a LinkedIn URL to the daemon over its Unix socket and prints the draft as it streams back.
+It deliberately imports nothing beyond the standard library's socket support, so it starts instantly.
+
+    python client.py https://www.linkedin.com/in/janedoe
+    python client.py            # prompt for URLs, like main.py
+"""
+import socket
+import json
+import sys
+import os
+
+
+# Where the daemon listens (override with the COLD_EMAIL_SOCKET environment variable)
+DEFAULT_SOCKET = os.environ.get('COLD_EMAIL_SOCKET') or os.path.join(os.path.expanduser('~'), '.cold-email-automator.sock')
+
+
+def request(job, socket_path=DEFAULT_SOCKET, on_message=None):
+    """
+    Send one job to the daemon and pass every message it streams back to `on_message`.
+    Returns the final message (type 'done' or 'error').
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(socket_path)
+        conn.sendall((json.dumps(job) + "\n").encode())
+        with conn.makefile('r', encoding='utf-8') as replies:
+            for line in replies:
+                message = json.loads(line)
+                if on_message:
+                    on_message(message)
+                if message["type"] in ('done', 'error'):
+                    return message
+    return {"type": "error", "message": "The daemon closed the connection before finishing."}
+
+
+def print_message(message):
+    """
+    Print a message from the daemon: tokens as they arrive, everything else on its own line.
+    """
+    if message["type"] == 'token':
+        print(message["text"], end='', flush=True)
+    elif message["type"] == 'status':
+        print(message["message"], flush=True)
+    elif message["type"] == 'done':
+        print(f"\n\n{message['message']}")
+    elif message["type"] == 'error':
+        print(f"\n{message['message']}")
+
+
+def run(linkedin_url, send, socket_path):
+    """
+    Draft (and send, unless `send` is False) an email for one URL. Returns True on success.
+    """
+    try:
+        reply = request({"url": linkedin_url, "send": send}, socket_path, print_message)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"The daemon is not running on {socket_path}. Start it with: python daemon.py")
+        return False
+    return reply["type"] == 'done'
+
+
+def usage():
+    print("Usage: python client.py [--no-send] [--socket PATH] [LINKEDIN_URL ...]")
+
+
+if __name__ == '__main__':
+    # Parsed by hand to keep startup free of argparse
+    args = sys.argv[1:]
+    send = True
+    socket_path = DEFAULT_SOCKET
+    urls = []
+    while args:
+        arg = args.pop(0)
+        if arg == '--no-send':
+            send = False
+        elif arg == '--socket' and args:
+            socket_path = args.pop(0)
+        elif arg in ('-h', '--help') or arg.startswith('-'):
+            usage()
+            sys.exit(0 if arg in ('-h', '--help') else 2)
+        else:
+            urls.append(arg)
+    if urls:
+        results = [run(url, send, socket_path) for url in urls]
+        sys.exit(0 if all(results) else 1)
+    try:
+        while True:
+            linkedin_url = input("Enter LinkedIn URL: ").strip()
+            if linkedin_url:
+                run(linkedin_url, send, socket_path)
+    except (KeyboardInterrupt, EOFError):
+        print()
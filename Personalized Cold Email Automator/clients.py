@@ -0,0 +1,375 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from collections import defaultdict, deque, Counter
+from openai import OpenAI, APIConnectionError, APIStatusError, RateLimitError
+from requests.adapters import HTTPAdapter
+from tracing import TRACER, percentile
+import deadlines
+import threading
+import requests
+import random
+import time
+import os
+
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}  # Responses worth retrying after a backoff
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that refills `rate_per_minute` units per minute, up to `capacity`.
+    acquire() blocks until the requested units are available (or its timeout would pass).
+    """
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        """
+        Add the units earned since the last update. Caller must hold the lock.
+        """
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1, timeout=None):
+        """
+        Take `amount` units, sleeping until the bucket has refilled enough. Returns True once they
+        are taken, or False (taking nothing) if they would not be available within `timeout`
+        seconds; a timeout of 0 never waits.
+        """
+        # A request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                self._refill()
+                if self.available >= amount:
+                    self.available -= amount
+                    return True
+                wait = (amount - self.available) / self.rate
+            if end is not None and time.monotonic() + wait > end:
+                return False
+            time.sleep(wait)
+
+    def adjust(self, amount):
+        """
+        Take (or give back, if negative) units without waiting. The bucket may go into debt,
+        which later acquire() calls pay off.
+        """
+        with self.lock:
+            self._refill()
+            self.available = min(self.capacity, self.available - amount)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits for one provider. Either limit may be None.
+    """
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, tokens=0, timeout=None):
+        """
+        Block until one request and `tokens` tokens fit within the limits. Returns False (taking
+        nothing) if they would not fit within `timeout` seconds; a timeout of 0 never waits.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        if self.requests and not self.requests.acquire(1, timeout):
+            return False
+        if self.tokens and tokens:
+            left = None if end is None else max(0.0, end - time.monotonic())
+            if not self.tokens.acquire(tokens, left):
+                if self.requests:
+                    self.requests.adjust(-1)
+                return False
+        return True
+
+    def record_usage(self, estimated, actual):
+        """
+        Correct the token bucket once the real token usage of a request is known.
+        """
+        if self.tokens:
+            self.tokens.adjust(actual - estimated)
+
+
+class Hedger:
+    """
+    Hedged requests: once a request has run longer than the p95 of recent latencies for its kind,
+    an identical duplicate is sent and whichever answers first wins. Hedging starts after
+    `min_samples` observations and is limited to `max_fraction` of the requests of each kind.
+    Latencies cover the request itself; callers wait for their rate limiter before run().
+    """
+    def __init__(self, pct=95, window=200, min_samples=20, max_fraction=0.1, workers=64):
+        self.pct = pct
+        self.min_samples = min_samples
+        self.max_fraction = max_fraction
+        self.latencies = defaultdict(lambda: deque(maxlen=window))   # kind -> recent successful latencies
+        self.requests = Counter()
+        self.hedged = Counter()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hedge')
+        self._lock = threading.Lock()
+
+    def threshold(self, kind):
+        """
+        Seconds after which a request of `kind` is hedged, or None while there are too few observations.
+        """
+        with self._lock:
+            samples = list(self.latencies[kind])
+        return percentile(samples, self.pct) if len(samples) >= self.min_samples else None
+
+    def _timed(self, kind, call, ok=None):
+        """
+        Run call() and record its latency if it succeeds (and ok(result), if given, is true).
+        """
+        start = time.monotonic()
+        result = call()
+        if ok is None or ok(result):
+            with self._lock:
+                self.latencies[kind].append(time.monotonic() - start)
+        return result
+
+    def run(self, kind, call, may_hedge=None, discard=None, ok=None):
+        """
+        Return the result of call(), sending a duplicate if the first one is slower than the threshold.
+        The duplicate is only sent if may_hedge() (e.g. a non-blocking rate limiter acquire) returns True.
+        A request wins only if it did not raise and ok(result), if given, is true (e.g. not a 429/5xx
+        response); only such requests are sampled for the threshold. discard(future) is called with the
+        request whose answer is not used once it finishes, so its usage can still be accounted for.
+        If neither request succeeds, the first request's result (or error) is returned (or raised).
+        """
+        threshold = self.threshold(kind)
+        with self._lock:
+            self.requests[kind] += 1
+            allowed = self.hedged[kind] < self.max_fraction * self.requests[kind]
+        if threshold is None or not allowed:
+            return self._timed(kind, call, ok)
+        primary = self._executor.submit(self._timed, kind, call, ok)
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+        if may_hedge is not None and not may_hedge():
+            TRACER.count(f"hedge_skipped:{kind}")
+            return primary.result()
+        with self._lock:
+            self.hedged[kind] += 1
+        TRACER.count(f"hedge:{kind}", threshold=threshold)
+        backup = self._executor.submit(self._timed, kind, call, ok)
+        pending = {primary, backup}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and (ok is None or ok(future.result())):
+                    if future is backup:
+                        TRACER.count(f"hedge_won:{kind}")
+                    if discard is not None:
+                        (primary if future is backup else backup).add_done_callback(discard)
+                    return future.result()
+        if discard is not None:
+            discard(backup)
+        return primary.result()
+
+    def stats(self):
+        """
+        Return the number of requests and hedged requests per kind.
+        """
+        with self._lock:
+            return {kind: {"requests": self.requests[kind], "hedged": self.hedged[kind]} for kind in sorted(self.requests)}
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """
+    Exponential backoff with full jitter, so that concurrent workers do not retry in lockstep.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after(response):
+    """
+    Return the Retry-After header of a response in seconds, or None if it is missing or not numeric.
+    """
+    try:
+        return float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(messages):
+    """
+    Rough prompt token count (about four characters per token) used to reserve tokens-per-minute.
+    """
+    return sum(len(message.get("content") or "") for message in messages) // 4 + 4 * len(messages)
+
+
+def fits_deadline(delay):
+    """
+    Check that sleeping `delay` seconds before a retry leaves time before the current deadline.
+    """
+    left = deadlines.remaining()
+    return left is None or delay < left
+
+
+class APIClients:
+    """
+    Long-lived, pooled clients for OpenAI and Scrapin, shared by every thread.
+    Each provider has its own rate limiter, and failed requests (429, 5xx, connection errors)
+    are retried with jittered exponential backoff, within the current deadline (see deadlines.py).
+    With a `hedger`, Scrapin requests and chat requests to `hedge_models` are hedged.
+    """
+    def __init__(self, openai_rpm=None, openai_tpm=None, scrapin_rpm=None, max_retries=4, pool_size=32,
+                 openai_base_url=None, hedger=None, hedge_models=()):
+        self.openai_base_url = openai_base_url   # None uses the SDK default (or OPENAI_BASE_URL)
+        self.hedger = hedger
+        self.hedge_models = set(hedge_models)
+        self.openai_limiter = RateLimiter(openai_rpm, openai_tpm)
+        self.scrapin_limiter = RateLimiter(scrapin_rpm)
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self._openai = None
+        self._scrapin = None
+        self._scrapin_key = None
+        self._lock = threading.Lock()
+
+    @property
+    def openai(self):
+        """
+        The shared OpenAI client (it keeps its own pool of HTTP connections).
+        """
+        with self._lock:
+            if self._openai is None:
+                api_key = os.getenv('OPENAI')
+                if not api_key:
+                    raise EnvironmentError("OPENAI API key not found in environment variables.")
+                # Retries are handled in chat() so they go through the rate limiter
+                self._openai = OpenAI(api_key=api_key, base_url=self.openai_base_url, max_retries=0)
+            return self._openai
+
+    @property
+    def scrapin(self):
+        """
+        The shared requests Session for Scrapin, with a connection pool sized for concurrent workers.
+        """
+        with self._lock:
+            if self._scrapin is None:
+                api_key = os.getenv('SCRAPIN')
+                if not api_key:
+                    raise EnvironmentError("SCRAPIN API key not found in environment variables.")
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._scrapin_key = api_key
+                self._scrapin = session
+            return self._scrapin
+
+    def _acquire(self, limiter, tokens=0):
+        """
+        Wait for `limiter`, but not past the current deadline (raises DeadlineExceeded).
+        """
+        deadlines.check()
+        if not limiter.acquire(tokens, timeout=deadlines.remaining()):
+            raise deadlines.DeadlineExceeded("Waiting for the rate limit would pass the deadline")
+
+    def _send(self, kind, hedge, call, may_hedge=None, discard=None, ok=None):
+        """
+        Run one request attempt, hedged if a hedger is configured and `hedge` is set.
+        """
+        if hedge and self.hedger is not None:
+            return self.hedger.run(kind, call, may_hedge, discard, ok)
+        return call()
+
+    def _record_usage(self, model, estimated, response):
+        """
+        Correct the token limiter and trace the token usage of a chat completion.
+        """
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            self.openai_limiter.record_usage(estimated, usage.total_tokens)
+            TRACER.record_usage(model, usage)
+
+    def chat(self, model, messages, timeout=None, **kwargs):
+        """
+        Create a chat completion through the shared client, within the OpenAI rate limits.
+        Each attempt times out after `timeout` seconds or at the current deadline, whichever is sooner.
+        """
+        client = self.openai
+        estimated = estimate_tokens(messages)
+        hedge = model in self.hedge_models and not kwargs.get('stream')
+
+        def may_hedge():
+            # A duplicate is only worth sending if the rate limits have room for it right now
+            return self.openai_limiter.acquire(estimated, timeout=0)
+
+        def discard(future):
+            # The unused request of a hedged pair is billed too
+            if future.exception() is not None:
+                self.openai_limiter.record_usage(estimated, 0)
+            else:
+                self._record_usage(model, estimated, future.result())
+        for attempt in range(self.max_retries + 1):
+            self._acquire(self.openai_limiter, estimated)
+            request_timeout = deadlines.timeout(timeout)
+            if request_timeout is not None:
+                kwargs['timeout'] = request_timeout
+
+            def call():
+                return client.chat.completions.create(model=model, messages=messages, **kwargs)
+            try:
+                response = self._send(f"openai:{model}", hedge, call, may_hedge, discard)
+            except (RateLimitError, APIConnectionError, APIStatusError) as e:
+                # A failed request used no tokens
+                self.openai_limiter.record_usage(estimated, 0)
+                status = getattr(e, 'status_code', None)
+                retryable = status is None or status in RETRY_STATUS_CODES
+                if not retryable or attempt == self.max_retries:
+                    raise
+                delay = retry_after(getattr(e, 'response', None)) or backoff_delay(attempt)
+                if not fits_deadline(delay):
+                    raise deadlines.DeadlineExceeded("No time left to retry before the deadline") from e
+                TRACER.count("retry:openai", model=model, status=status, delay=delay)
+                print(f"OpenAI request failed ({status or type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            self._record_usage(model, estimated, response)
+            return response
+
+    def scrapin_get(self, url, params, timeout=None, **kwargs):
+        """
+        GET a Scrapin endpoint through the shared session, within the Scrapin rate limit.
+        The API key is added to `params`. Returns the last response once retries are exhausted.
+        Each attempt times out after `timeout` seconds or at the current deadline, whichever is sooner.
+        """
+        session = self.scrapin
+        params = dict(params, apikey=self._scrapin_key)
+        kind = "scrapin:" + url.rstrip('/').rsplit('/', 1)[-1]
+        for attempt in range(self.max_retries + 1):
+            self._acquire(self.scrapin_limiter)
+            request_timeout = deadlines.timeout(timeout)
+
+            def call():
+                return session.get(url, params=params, timeout=request_timeout, **kwargs)
+            try:
+                # A 429/5xx answer must not beat a healthy request that is still running
+                response = self._send(kind, True, call, lambda: self.scrapin_limiter.acquire(timeout=0),
+                                      ok=lambda response: response.status_code not in RETRY_STATUS_CODES)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                if not fits_deadline(delay):
+                    raise deadlines.DeadlineExceeded("No time left to retry before the deadline") from e
+                TRACER.count("retry:scrapin", error=type(e).__name__, delay=delay)
+                print(f"Scrapin request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                return response
+            delay = retry_after(response) or backoff_delay(attempt)
+            if not fits_deadline(delay):
+                return response
+            TRACER.count("retry:scrapin", status=response.status_code, delay=delay)
+            print(f"Scrapin request failed ({response.status_code}), retrying in {delay:.1f}s")
+            time.sleep(delay)
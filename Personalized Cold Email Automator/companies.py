@@ -0,0 +1,215 @@
+from concurrent.futures import Future
+from collections import Counter
+from tracing import TRACER
+import threading
+import sqlite3
+import time
+import re
+
+
+# Legal suffixes that do not distinguish one company from another
+COMPANY_SUFFIXES = {'inc', 'incorporated', 'llc', 'ltd', 'limited', 'corp', 'corporation', 'co', 'company',
+                    'gmbh', 'plc', 'sa', 'ag'}
+
+
+def normalize_company_name(name):
+    """
+    Normalize a company name so that 'Acme, Inc.' and 'acme' share one key.
+    """
+    words = re.sub(r'[^a-z0-9&]+', ' ', (name or '').lower()).split()
+    while len(words) > 1 and words[-1] in COMPANY_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+class CompanyKnowledgeBase:
+    """
+    Local store of what is known about each company (domain, industry, mission), keyed by its
+    LinkedIn company URL and by its normalized name. Lookups are single-flight: when several
+    threads ask for the same unknown company, one of them fetches it and the others wait for
+    its answer. Entries older than `ttl` seconds are fetched again.
+    """
+    def __init__(self, path, table='companies', ttl=None):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.hits = Counter()
+        self.misses = Counter()
+        self._missing = set()     # Companies Scrapin reported as not found during this run
+        self._refreshed = set()   # Companies fetched again during this run because of refresh=True
+        self._inflight = {}       # (kind, key) -> Future of the running fetch
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        """
+        Open the database on first use and create the table if needed. Caller must hold the lock.
+        """
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, linkedin_url TEXT, name TEXT NOT NULL, domain TEXT, industry TEXT, "
+                "mission TEXT, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_name ON {self.table} (name)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def key(linkedin_url, name):
+        """
+        Return the key of a company: its LinkedIn URL if known, otherwise its normalized name.
+        """
+        return linkedin_url or 'name:' + normalize_company_name(name)
+
+    def get(self, linkedin_url, name):
+        """
+        Return the stored entry (a dict with domain, industry and mission) for a company, or None.
+        Without a LinkedIn URL, any entry with the same normalized name is used; with one, only that
+        URL's entry is (different employers can share a name). Fields that were never looked up are None.
+        """
+        with self._lock:
+            try:
+                conn = self._connection()
+                row = conn.execute(
+                    f"SELECT domain, industry, mission, updated_at FROM {self.table} WHERE key = ?",
+                    (self.key(linkedin_url, name),)
+                ).fetchone()
+                if row is None and not linkedin_url and normalize_company_name(name):
+                    row = conn.execute(
+                        f"SELECT domain, industry, mission, updated_at FROM {self.table} WHERE name = ? "
+                        "ORDER BY updated_at DESC LIMIT 1", (normalize_company_name(name),)
+                    ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading from company knowledge base: {e}")
+                return None
+        if row is None or (self.ttl is not None and time.time() - row[3] > self.ttl):
+            return None
+        return {"domain": row[0], "industry": row[1], "mission": row[2]}
+
+    def put(self, linkedin_url, name, **fields):
+        """
+        Store or update fields (domain, industry, mission) of a company.
+        """
+        key = self.key(linkedin_url, name)
+        columns = [column for column in ('domain', 'industry', 'mission') if column in fields]
+        updates = "".join(f", {column} = excluded.{column}" for column in columns)
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.execute(
+                    f"INSERT INTO {self.table} (key, linkedin_url, name, updated_at"
+                    f"{''.join(', ' + column for column in columns)}) VALUES (?, ?, ?, ?{', ?' * len(columns)}) "
+                    f"ON CONFLICT(key) DO UPDATE SET updated_at = excluded.updated_at{updates}",
+                    [key, linkedin_url, normalize_company_name(name), time.time()] + [fields[c] for c in columns]
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing to company knowledge base: {e}")
+
+    def _single_flight(self, flight, compute):
+        """
+        Run compute() unless another thread is already running it for `flight`; then wait for that result.
+        """
+        with self._lock:
+            future = self._inflight.get(flight)
+            owner = future is None
+            if owner:
+                future = self._inflight[flight] = Future()
+        if not owner:
+            return future.result()
+        try:
+            value = compute()
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[flight]
+
+    def company(self, linkedin_url, name, fetch, refresh=False):
+        """
+        Return the entry for a company, calling fetch() only if the company is not stored yet (or,
+        with `refresh`, the first time it is asked for during this run). fetch() returns a dict with
+        domain and industry, {} if the company does not exist, or None if the lookup failed.
+        Companies that do not exist are not fetched again during this run; failed lookups are.
+        """
+        key = self.key(linkedin_url, name)
+        if key in self._missing:
+            return None
+
+        def stored():
+            if refresh and key not in self._refreshed:
+                return None
+            entry = self.get(linkedin_url, name)
+            return entry if entry is not None and entry["domain"] is not None else None
+        entry = stored()
+        if entry is not None:
+            self._count('company', hit=True)
+            return entry
+
+        def compute():
+            # Another thread may have stored it between our lookup and taking the flight
+            entry = stored()
+            if entry is not None:
+                return entry
+            self._count('company', hit=False)
+            fetched = fetch()
+            if fetched is None:
+                return None
+            self._refreshed.add(key)
+            if not fetched:
+                self._missing.add(key)
+                return None
+            entry = {"domain": fetched.get('domain', ''), "industry": fetched.get('industry', ''), "mission": None}
+            self.put(linkedin_url, name, domain=entry["domain"], industry=entry["industry"])
+            return entry
+        return self._single_flight(('company', key), compute)
+
+    def mission(self, linkedin_url, name, fetch):
+        """
+        Return the mission of a company, calling fetch() only if it has not been looked up yet.
+        fetch() returns None if the lookup failed; that is not stored, and None is returned.
+        """
+        entry = self.get(linkedin_url, name)
+        if entry is not None and entry["mission"] is not None:
+            self._count('mission', hit=True)
+            return entry["mission"]
+
+        def compute():
+            entry = self.get(linkedin_url, name)
+            if entry is not None and entry["mission"] is not None:
+                return entry["mission"]
+            self._count('mission', hit=False)
+            mission = fetch()
+            if mission is not None:
+                self.put(linkedin_url, name, mission=mission)
+            return mission
+        return self._single_flight(('mission', self.key(linkedin_url, name)), compute)
+
+    def _count(self, kind, hit):
+        """
+        Count a hit or a miss of `kind`.
+        """
+        with self._lock:
+            (self.hits if hit else self.misses)[kind] += 1
+        TRACER.count(f"{'kb_hit' if hit else 'kb_miss'}:{kind}")
+
+    def stats(self):
+        """
+        Return hit/miss counters per kind ('company' and 'mission').
+        """
+        kinds = sorted(set(self.hits) | set(self.misses))
+        return {kind: {"hits": self.hits[kind], "misses": self.misses[kind]} for kind in kinds}
+
+    def close(self):
+        """
+        Close the underlying database connection.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
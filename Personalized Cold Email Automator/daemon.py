@@ -0,0 +1,206 @@
+"""
+Long-running local daemon for the cold emailing tool.
+
+Keeps the heavy imports, the pooled (already connected) OpenAI and Scrapin clients and the prompt
+templates warm, and drafts emails for jobs sent over a Unix socket by client.py. The draft is
+streamed back to the client as it is generated.
+
+    python daemon.py &
+    python client.py https://www.linkedin.com/in/janedoe
+
+Protocol: the client sends one JSON line ({"url": ..., "send": true}); the daemon answers with JSON
+lines of type 'status', 'token' (a piece of the draft), and finally 'done' or 'error'.
+"""
+from client import DEFAULT_SOCKET
+from clients import Hedger
+from deadlines import deadline, DeadlineExceeded
+import socketserver
+import threading
+import traceback
+import argparse
+import socket
+import json
+import time
+import os
+
+import main
+
+
+KEEPALIVE_SECONDS = 240   # Re-open idle connections this often so the first request never pays a TLS handshake
+
+
+def warm_connections():
+    """
+    Open the pooled connections to Scrapin and OpenAI (TLS handshake included) ahead of the first job.
+    """
+    try:
+        main.CLIENTS.scrapin.head(main.SCRAPIN_BASE_URL, timeout=10)
+    except Exception as e:
+        print(f"Could not warm the Scrapin connection: {e}")
+    try:
+        main.CLIENTS.openai.models.list()
+    except Exception as e:
+        print(f"Could not warm the OpenAI connection: {e}")
+
+
+def keep_warm(interval, stop):
+    """
+    Re-warm the connections every `interval` seconds until `stop` is set.
+    """
+    while not stop.wait(interval):
+        warm_connections()
+
+
+def run_job(job, reply):
+    """
+    Draft (and, unless job['send'] is false, send) an email for job['url'], streaming progress through
+    reply(type, **fields). Mirrors the interactive loop of main.main().
+    """
+    linkedin_url = (job.get('url') or '').strip()
+    if not main.is_valid_linkedin_url(linkedin_url):
+        reply('error', message="Invalid LinkedIn URL. Example: https://www.linkedin.com/in/janedoe")
+        return
+    if main.is_suppressed(linkedin_url):
+        reply('error', message="This prospect was already contacted (see the suppression index). Skipping.")
+        return
+    start = time.monotonic()
+    profile_data = main.webscrape(linkedin_url, 'profile')
+    if not profile_data:
+        reply('error', message="Failed to retrieve profile data. Please check the URL or try again later.")
+        return
+    person = main.get_person(profile_data)
+    reply('status', message=f"Drafting an email to {person.first} {person.last}:\n")
+    stats = {}
+    prompt_file, body = main.compose_speculatively(person, on_token=lambda text: reply('token', text=text),
+                                                   stats=stats, stream=True)
+    if not body:
+        reply('error', message="Failed to compose email message. Aborting email sending.")
+        return
+    person.upadate_emails()
+    if not person.emails:
+        reply('error', message="No possible emails generated. Aborting.")
+        return
+    emails = main.unsuppressed_emails(person.emails)
+    if not emails:
+        reply('error', message="Every possible email was already contacted. Aborting.")
+        return
+    sent = False
+    if job.get('send', True):
+        sent = main.send_bcc_emails(",".join(emails), main.SUBJECT_LINE, body)
+        if not sent:
+            reply('error', message="Failed to deliver the email.")
+            return
+        main.record_contacted(linkedin_url, emails)
+    timing = f"{time.monotonic() - start:.1f}s total"
+    if stats.get("time_to_first_token") is not None:
+        timing = f"first token after {stats['time_to_first_token']:.1f}s of generation, {timing}"
+    if main.SPECULATIVE_COMPOSE:
+        timing += f"; speculation: {main.format_speculation_stats()}"
+    reply('done', message=f"{'Email composed successfully' if sent else 'Draft ready (not sent)'} "
+                          f"with {os.path.basename(prompt_file)} ({timing}).",
+          body=body, emails=emails, prompt_file=os.path.basename(prompt_file), sent=sent)
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """
+    Handles one client connection: reads a JSON job line and streams JSON reply lines back.
+    """
+    def reply(self, type, **fields):
+        self.wfile.write((json.dumps(dict(fields, type=type)) + "\n").encode())
+
+    def handle(self):
+        try:
+            job = json.loads(self.rfile.readline())
+        except ValueError:
+            self.reply('error', message="Malformed job: expected one JSON line.")
+            return
+        try:
+            with deadline(main.PROSPECT_DEADLINE):
+                run_job(job, self.reply)
+        except DeadlineExceeded:
+            self.reply('error', message=f"Ran out of time for this prospect "
+                                        f"(PROSPECT_DEADLINE is {main.PROSPECT_DEADLINE}s).")
+        except (BrokenPipeError, ConnectionResetError):
+            print(f"Client disconnected during {job.get('url')}")
+        except Exception as e:
+            traceback.print_exc()
+            try:
+                self.reply('error', message=f"Unexpected error: {type(e).__name__}: {e}")
+            except OSError:
+                pass
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def claim_socket(path):
+    """
+    Remove a stale socket file at `path`. Raises RuntimeError if another daemon is still listening on it.
+    """
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(path)
+            return
+    raise RuntimeError(f"Another daemon is already listening on {path}.")
+
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Warm daemon for the cold emailing tool")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help="Unix socket to listen on")
+    parser.add_argument('--delivery', choices=['applemail', 'smtp', 'eml', 'mbox', 'null'],
+                        help="Delivery backend (default: DELIVERY_BACKEND)")
+    parser.add_argument('--speculate', action='store_true',
+                        help="Start drafting with the most likely prompt file while the LLM chooses one")
+    parser.add_argument('--deadline', type=float, metavar='SECONDS',
+                        help="Seconds of work allowed per job (default: PROSPECT_DEADLINE; 0 for no deadline)")
+    parser.add_argument('--hedge', action='store_true',
+                        help="Send a duplicate of Scrapin and SIMPLE_MODEL requests slower than their p95 latency")
+    parser.add_argument('--keepalive', type=float, default=KEEPALIVE_SECONDS,
+                        help="Seconds between connection warm-ups (0 disables them)")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main.DELIVERY_BACKEND = args.delivery or main.DELIVERY_BACKEND
+    main.SPECULATIVE_COMPOSE = main.SPECULATIVE_COMPOSE or args.speculate
+    if args.deadline is not None:
+        main.PROSPECT_DEADLINE = args.deadline or None
+    if main.HEDGE_REQUESTS or args.hedge:
+        main.CLIENTS.hedger = Hedger(main.HEDGE_PERCENTILE, max_fraction=main.HEDGE_MAX_FRACTION)
+    try:
+        # Load environment variables from a .env file if present
+        main.load_dotenv()
+    except Exception as e:
+        print("Error loading environment variables:", e)
+    main.PROMPTS.load_all()
+    warm_connections()
+    try:
+        claim_socket(args.socket)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    stop = threading.Event()
+    if args.keepalive:
+        threading.Thread(target=keep_warm, args=(args.keepalive, stop), daemon=True).start()
+    server = DaemonServer(args.socket, JobHandler)
+    os.chmod(args.socket, 0o600)
+    print(f"Cold email daemon ready on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        main.close_delivery_backend()
+        main.SUPPRESSION.close()
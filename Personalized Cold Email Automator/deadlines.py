@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+import contextvars
+import time
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when the work for a prospect has run out of time.
+    """
+
+
+# Monotonic time by which the current prospect must be done (None: no deadline)
+_deadline = contextvars.ContextVar('deadline', default=None)
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Give the enclosed work `seconds` to finish (None for no limit). The deadline follows the work
+    into asyncio.to_thread calls and into threads started with submit(). A nested deadline can only
+    shorten the enclosing one.
+    """
+    if seconds is None:
+        yield
+        return
+    end = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(end if current is None else min(current, end))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """
+    Seconds left before the current deadline, or None if there is none.
+    """
+    end = _deadline.get()
+    return None if end is None else end - time.monotonic()
+
+
+def postpone(seconds):
+    """
+    Move the current deadline `seconds` later, e.g. by the time spent queueing for a stage slot,
+    so that waiting behind other prospects does not use up this one's time. The enclosing
+    deadline() restores the original value when it exits.
+    """
+    end = _deadline.get()
+    if end is not None and seconds > 0:
+        _deadline.set(end + seconds)
+
+
+def check():
+    """
+    Raise DeadlineExceeded if the current deadline has passed.
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("Deadline exceeded")
+
+
+def timeout(stage_timeout):
+    """
+    Timeout for one request: `stage_timeout` (None for no limit), shortened to the time left
+    before the current deadline. Raises DeadlineExceeded if none is left.
+    """
+    check()
+    left = remaining()
+    if left is None:
+        return stage_timeout
+    return left if stage_timeout is None else min(stage_timeout, left)
+
+
+def submit(executor, function, *args, **kwargs):
+    """
+    executor.submit() that runs `function` under the caller's deadline.
+    """
+    return executor.submit(contextvars.copy_context().run, function, *args, **kwargs)
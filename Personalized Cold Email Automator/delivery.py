@@ -0,0 +1,167 @@
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from clients import TokenBucket
+import subprocess
+import threading
+import mailbox
+import smtplib
+import re
+import os
+
+
+def build_message(sender, recipients, subject, body):
+    """
+    Build an email with every recipient in Bcc (smtplib leaves the Bcc header out when sending).
+    """
+    message = EmailMessage()
+    message['From'] = sender or ''
+    message['Bcc'] = ", ".join(recipients)
+    message['Subject'] = subject
+    message['Date'] = formatdate(localtime=True)
+    message['Message-ID'] = make_msgid()
+    message.set_content(body)
+    return message
+
+
+class AppleMailBackend:
+    """
+    Opens each message as a draft in Apple Mail through an AppleScript (one osascript per message).
+    """
+    name = 'applemail'
+
+    def __init__(self, script_path):
+        if not os.path.exists(script_path):
+            raise FileNotFoundError(f"BCC email script not found: {script_path}")
+        self.script_path = script_path
+
+    def send(self, recipients, subject, body):
+        subprocess.check_call(['osascript', self.script_path, ",".join(recipients), subject, body])
+
+    def close(self):
+        pass
+
+
+class SMTPBackend:
+    """
+    Sends messages over a single authenticated SMTP connection that is reused across messages
+    (and re-opened if the server drops it). Messages are spaced out to `rate_per_minute`.
+    """
+    name = 'smtp'
+
+    def __init__(self, host, port=587, username=None, password=None, sender=None, use_tls=True,
+                 rate_per_minute=None, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.pacer = TokenBucket(rate_per_minute, capacity=1) if rate_per_minute else None
+        self._smtp = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """
+        Open and authenticate the connection. Caller must hold the lock.
+        """
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password or '')
+        self._smtp = smtp
+
+    def send(self, recipients, subject, body):
+        message = build_message(self.sender, recipients, subject, body)
+        if self.pacer:
+            self.pacer.acquire()
+        with self._lock:
+            if self._smtp is None:
+                self._connect()
+            try:
+                self._smtp.send_message(message, from_addr=self.sender, to_addrs=recipients)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # The server closed an idle connection; reconnect once and try again
+                self._connect()
+                self._smtp.send_message(message, from_addr=self.sender, to_addrs=recipients)
+
+    def close(self):
+        with self._lock:
+            if self._smtp is not None:
+                try:
+                    self._smtp.quit()
+                except smtplib.SMTPException:
+                    pass
+                self._smtp = None
+
+
+class EmlBackend:
+    """
+    Writes each message to its own .eml file in a directory, for review before sending.
+    """
+    name = 'eml'
+
+    def __init__(self, directory, sender=None):
+        self.directory = directory
+        self.sender = sender
+        os.makedirs(directory, exist_ok=True)
+        # Continue numbering after the files already in the directory
+        self.count = len(os.listdir(directory))
+        self._lock = threading.Lock()
+
+    def send(self, recipients, subject, body):
+        message = build_message(self.sender, recipients, subject, body)
+        with self._lock:
+            self.count += 1
+            first_recipient = re.sub(r'[^a-z0-9._-]+', '_', recipients[0].lower()) if recipients else 'draft'
+            path = os.path.join(self.directory, f"{self.count:05d}-{first_recipient}.eml")
+        with open(path, 'wb') as file:
+            file.write(message.as_bytes())
+
+    def close(self):
+        pass
+
+
+class MboxBackend:
+    """
+    Appends every message to a single mbox file, for review or import into a mail client.
+    """
+    name = 'mbox'
+
+    def __init__(self, path, sender=None):
+        self.sender = sender
+        self.mbox = mailbox.mbox(path)
+        self._lock = threading.Lock()
+
+    def send(self, recipients, subject, body):
+        message = build_message(self.sender, recipients, subject, body)
+        with self._lock:
+            self.mbox.lock()
+            try:
+                self.mbox.add(message)
+                self.mbox.flush()
+            finally:
+                self.mbox.unlock()
+
+    def close(self):
+        with self._lock:
+            self.mbox.close()
+
+
+class NullBackend:
+    """
+    Discards every message (counting them), for benchmarks and dry runs.
+    """
+    name = 'null'
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def send(self, recipients, subject, body):
+        with self._lock:
+            self.count += 1
+
+    def close(self):
+        pass
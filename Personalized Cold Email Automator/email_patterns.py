@@ -0,0 +1,110 @@
+import threading
+import json
+import os
+
+
+# Email address patterns, in the order they are guessed when nothing is known about a domain
+EMAIL_PATTERNS = [
+    ("first.last", "{first}.{last}"),
+    ("flast", "{f}{last}"),
+    ("firstl", "{first}{l}"),
+    ("first", "{first}"),
+    ("last", "{last}"),
+    ("firstlast", "{first}{last}"),
+    ("first_last", "{first}_{last}"),
+    ("first-last", "{first}-{last}"),
+]
+PATTERN_NAMES = [name for name, _ in EMAIL_PATTERNS]
+
+
+def render_local_part(template, first, last):
+    """
+    Fill in an email pattern template with a (lowercase) first and last name.
+    """
+    return template.format(first=first, last=last, f=first[0], l=last[0])
+
+
+def match_pattern(address, first, last):
+    """
+    Return the name of the pattern that produces `address` for this first and last name, or None.
+    """
+    local_part = address.split('@')[0].lower()
+    first, last = first.lower(), last.lower()
+    if not first or not last:
+        return None
+    for name, template in EMAIL_PATTERNS:
+        if render_local_part(template, first, last) == local_part:
+            return name
+    return None
+
+
+class PatternIndex:
+    """
+    Per-domain counts of delivered and bounced addresses for each email pattern.
+    The index is a dict held in memory (one lookup per domain) and saved as JSON.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.domains = {}   # domain -> {pattern name: [delivered, bounced]}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """
+        Load the index from disk, if it exists.
+        """
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as file:
+                self.domains = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Error loading email pattern index {self.path}: {e}")
+
+    def save(self):
+        """
+        Write the index to disk.
+        """
+        with self._lock:
+            with open(self.path + '.tmp', 'w') as file:
+                json.dump(self.domains, file)
+            os.replace(self.path + '.tmp', self.path)
+
+    def record(self, domain, pattern, delivered=True):
+        """
+        Count one delivered (or bounced) address with the given pattern at `domain`.
+        """
+        with self._lock:
+            counts = self.domains.setdefault(domain.lower(), {}).setdefault(pattern, [0, 0])
+            counts[0 if delivered else 1] += 1
+
+    def record_address(self, address, first, last, delivered=True):
+        """
+        Work out the pattern of a known address and count it. Returns the pattern name, or None
+        if the address does not follow any known pattern for this name.
+        """
+        if '@' not in address:
+            return None
+        pattern = match_pattern(address, first, last)
+        if pattern:
+            self.record(address.split('@')[1], pattern, delivered)
+        return pattern
+
+    def top_patterns(self, domain, k):
+        """
+        Return up to `k` pattern names that have delivered at `domain`, most reliable first.
+        If nothing has delivered there yet, return every pattern that has not bounced there (possibly
+        none). Returns None only for a domain with no recorded outcomes (so every pattern should be tried).
+        """
+        stats = self.domains.get(domain.lower())
+        if not stats:
+            return None
+        # Laplace-smoothed delivery rate, then the number of deliveries to break ties
+        ranked = sorted(
+            (pattern for pattern, (delivered, _) in stats.items() if delivered and pattern in PATTERN_NAMES),
+            key=lambda pattern: ((stats[pattern][0] + 1) / (sum(stats[pattern]) + 2), stats[pattern][0]),
+            reverse=True,
+        )
+        if ranked:
+            return ranked[:k]
+        return [pattern for pattern in PATTERN_NAMES if not stats.get(pattern, [0, 0])[1]]
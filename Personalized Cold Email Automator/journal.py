@@ -0,0 +1,92 @@
+import threading
+import sqlite3
+import json
+import time
+
+
+# Pipeline stages in order; a prospect's stage is the last one it completed
+STAGES = ['scraped', 'enriched', 'prompt_selected', 'composed', 'sent']
+JSON_COLUMNS = {'profile', 'person', 'emails'}
+COLUMNS = ['profile', 'person', 'prompt_file', 'body', 'emails']
+
+
+def reached(entry, stage):
+    """
+    Return True if the journal entry (or None) has completed `stage`.
+    """
+    return bool(entry) and STAGES.index(entry["stage"]) >= STAGES.index(stage)
+
+
+class CampaignJournal:
+    """
+    Durable record of each prospect's progress through the pipeline, with the artifacts of every
+    completed stage (profile data, enriched person, prompt file, draft, emails). Stored in SQLite
+    in write-ahead-log mode, so a run that dies can resume each prospect where it stopped.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prospects ("
+            "url TEXT PRIMARY KEY, stage TEXT NOT NULL, profile TEXT, person TEXT, prompt_file TEXT, "
+            "body TEXT, emails TEXT, error TEXT, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, url):
+        """
+        Return the entry for `url` as a dict (stage, artifacts and last error), or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT stage, {', '.join(COLUMNS)}, error FROM prospects WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = {"stage": row[0], "error": row[-1]}
+        for column, value in zip(COLUMNS, row[1:-1]):
+            entry[column] = json.loads(value) if column in JSON_COLUMNS and value is not None else value
+        return entry
+
+    def record(self, url, stage, **artifacts):
+        """
+        Mark `url` as having completed `stage` and store the given artifacts (other columns are kept).
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown journal stage '{stage}'. Must be one of {STAGES}.")
+        columns = [column for column in COLUMNS if column in artifacts]
+        values = [json.dumps(artifacts[column]) if column in JSON_COLUMNS else artifacts[column] for column in columns]
+        updates = "".join(f", {column} = excluded.{column}" for column in columns)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO prospects (url, stage, error, updated_at{''.join(', ' + c for c in columns)}) "
+                f"VALUES (?, ?, NULL, ?{', ?' * len(columns)}) "
+                f"ON CONFLICT(url) DO UPDATE SET stage = excluded.stage, error = NULL, "
+                f"updated_at = excluded.updated_at{updates}",
+                [url, stage, time.time()] + values
+            )
+            self._conn.commit()
+
+    def record_error(self, url, error):
+        """
+        Store the last error for `url` without changing its stage.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE prospects SET error = ?, updated_at = ? WHERE url = ?", (error, time.time(), url)
+            )
+            self._conn.commit()
+
+    def counts(self):
+        """
+        Return the number of prospects at each stage.
+        """
+        with self._lock:
+            return dict(self._conn.execute("SELECT stage, COUNT(*) FROM prospects GROUP BY stage").fetchall())
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,9 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from collections import Counter
 from dotenv import load_dotenv
-from openai import OpenAI
+from cache import PersistentCache
+from tracing import TRACER
+from clients import APIClients, Hedger, estimate_tokens
+from deadlines import deadline, DeadlineExceeded
+from templates import TemplateRegistry
+from routing import PromptRouter
+from email_patterns import PatternIndex, EMAIL_PATTERNS, render_local_part
+from journal import CampaignJournal, reached
+from companies import CompanyKnowledgeBase
+from summary import fit_sections, count_tokens
+from speculation import Cancellation, TokenRelay
+from suppression import SuppressionIndex
+from delivery import AppleMailBackend, SMTPBackend, EmlBackend, MboxBackend, NullBackend
+from bulk import (OpenAIBatchBackend, LocalBatchBackend, TERMINAL_STATUSES,
+                  write_batch_requests, parse_batch_output)
 import subprocess
+import deadlines
+import threading
 import traceback
+import argparse
+import hashlib
 import requests
+import asyncio
 import json
+import time
+import csv
+import sys
 import os
 
 
@@ -14,12 +39,176 @@ PROMPT_FILE = 'vc.txt'                         # Prompt file if MULTIPLE_PROMPTS
 SIMPLE_MODEL = '4o-mini'                       # Model for simple tasks
 LARGER_MODEL = 'o1-mini'                       # Model for writing an emai
 
+# Rule-based prompt selection: keywords in the headline, current titles and industries per prompt file.
+# The LLM (prompt-selection.txt) is only asked when the rules are less confident than ROUTING_MIN_CONFIDENCE.
+# Only specific phrases count: generic words like 'investor' also describe bankers and investor relations.
+ROUTING_RULES = {
+    'vc.txt': ['venture capital', 'venture capitalist', 'venture partner', 'general partner',
+               'angel investor', 'vc', 'ventures', 'private equity'],
+    'founder.txt': ['founder', 'co-founder', 'cofounder', 'founding', 'stealth'],
+}
+# A field (headline, title, industry) containing one of these phrases never counts for that prompt file
+ROUTING_EXCLUSIONS = {
+    'vc.txt': ['investor relations', 'investment banking', 'investment banker'],
+}
+ROUTING_MIN_FIELDS = 2                         # Fields that must agree before the rules alone decide
+ROUTING_MIN_CONFIDENCE = 0.75                  # 0 to 1; set above 1 to always ask the LLM
+
+# Ask SIMPLE_MODEL for gender, mission and prompt file in one structured request per profile
+# instead of three separate ones. Invalid fields fall back to the individual lookups.
+PROFILE_ANALYSIS = False
+
+# Stream the email draft as it is generated (interactive mode prints it token by token)
+STREAM_COMPOSE = False
+COMPOSE_MAX_CHARS = 5000                       # Batch mode: cancel streamed drafts longer than this
+COMPOSE_MAX_SECONDS = 120                      # Batch mode: cancel streamed drafts that take longer than this
+
+# Interactive mode: while the LLM picks a prompt file, start drafting with the most likely one
+# (the keyword rules' best guess, else the last one used) and keep that draft if the guess was right
+SPECULATIVE_COMPOSE = False
+SPECULATION_MAX_WASTED_TOKENS = 20000          # Stop speculating once discarded drafts have used this many tokens
+
+# Learned email patterns: for domains with confirmed addresses, only the top patterns are BCC'd
+EMAIL_PATTERN_FILE = 'email_patterns.json'     # Index of delivered/bounced patterns per domain
+EMAIL_PATTERN_TOP_K = 2                        # Patterns to try at a known domain
+SUPPRESSION_FILE = 'suppression.sqlite3'       # Prospects already contacted (URLs and addresses), never contacted again
+
+# Email delivery: 'applemail' (drafts in Apple Mail), 'smtp' (send directly over one pooled connection),
+# 'eml' (one .eml file per message in DELIVERY_PATH), 'mbox' (all messages in DELIVERY_PATH) or 'null'
+DELIVERY_BACKEND = 'applemail'
+DELIVERY_PATH = 'outbox'                       # Directory for 'eml', file for 'mbox'
+SMTP_RATE_PER_MINUTE = 20                      # Pace of the SMTP backend (SMTP_HOST, SMTP_PORT, SMTP_USER,
+                                               # SMTP_PASSWORD, SMTP_FROM and SMTP_TLS come from .env)
+
+# Prices in dollars per million (input, output) tokens, for the --profile cost report
+MODEL_PRICES = {
+    '4o-mini': (0.15, 0.60),
+    'gpt-4o-mini': (0.15, 0.60),
+    'o1-mini': (1.10, 4.40),
+}
+
+# Shared API clients: rate limits per provider and retries on 429/5xx
+SCRAPIN_BASE_URL = 'https://api.scrapin.io'     # Scrapin API root (the benchmark points it at a local stand-in)
+OPENAI_REQUESTS_PER_MINUTE = 500               # Set to your OpenAI tier's limits
+OPENAI_TOKENS_PER_MINUTE = 200000
+SCRAPIN_REQUESTS_PER_MINUTE = 60               # Set to your Scrapin plan's limit
+API_MAX_RETRIES = 4                            # Retries with jittered exponential backoff
+HTTP_POOL_SIZE = 32                            # Pooled connections kept open per provider
+
+# Deadlines: each prospect gets PROSPECT_DEADLINE seconds of work (time spent queueing for a batch stage
+# is not counted), and each request at most its stage's timeout. Retries stop at the deadline.
+PROSPECT_DEADLINE = 300                        # Seconds per prospect (None for no deadline)
+STAGE_TIMEOUTS = {
+    'scrape': 30,    # One Scrapin request
+    'lookup': 30,    # One SIMPLE_MODEL request (gender, mission, prompt selection, profile analysis)
+    'compose': 180,  # One LARGER_MODEL request (without streaming; streamed drafts use COMPOSE_MAX_SECONDS)
+}
+
+# Hedged requests: a Scrapin or SIMPLE_MODEL request still running after the p95 latency of its kind
+# is sent a second time and the first answer wins (at most HEDGE_MAX_FRACTION of requests are duplicated)
+HEDGE_REQUESTS = False
+HEDGE_PERCENTILE = 95
+HEDGE_MAX_FRACTION = 0.1
+
+# Threads for the independent lookups inside get_person (shared by all prospects in batch mode)
+ENRICHMENT_WORKERS = 32
+
+# Batch mode: maximum number of prospects in flight at each pipeline stage
+BATCH_STAGE_LIMITS = {
+    'scrape': 8,    # Scrapin profile requests
+    'enrich': 8,    # get_person (company scrapes, gender, mission)
+    'prompt': 8,    # prompt selection
+    'compose': 4,   # LARGER_MODEL email composition
+    'send': 1,      # Apple Mail drafts (one osascript at a time)
+}
+BATCH_OUTPUT_FILE = 'batch_results.jsonl'      # Default batch output (drafts + per-URL status)
+BULK_JOB_DIR = 'bulk_job'                      # Default directory for an OpenAI Batch API job
+BULK_POLL_SECONDS = 60                         # How often --bulk-collect checks the batch job
+JOURNAL_FILE = 'journal.sqlite3'               # Batch progress per prospect, so interrupted runs resume
+BATCH_PREFETCH_COMPANIES = True                # Enrich each distinct company once before composing any email
+
+# Persistent cache of Scrapin responses, stored next to this script
+CACHE_DB = 'cache.sqlite3'                     # SQLite file for all persistent caches
+SCRAPE_CACHE_TTLS = {                          # Seconds before a cached response is fetched again
+    'profile': 7 * 24 * 3600,
+    'company': 30 * 24 * 3600,
+}
+SCRAPE_CACHE_MAX_ENTRIES = 20000               # Least recently used responses are evicted above this
+REFRESH_CACHE = False                          # Ignore cached responses (set by --refresh)
+
+
+# Persistent memoization of small LLM lookups (gender of a first name, mission of a company)
+LLM_CACHE_TTLS = {'mission': 90 * 24 * 3600}   # Missions change occasionally; gender answers never expire
+LLM_CACHE_MAX_ENTRIES = 50000                  # Least recently used answers are evicted above this
+PREWARM_WORKERS = 8                            # Concurrent lookups when pre-warming the LLM cache
+
+# Company knowledge base (domain, industry, mission per company), stored in CACHE_DB
+COMPANY_KB_TTL = 90 * 24 * 3600                # Seconds before a company is looked up again
+
+# Token budget for the profile summary sent to the LLMs (None sends everything)
+SUMMARY_TOKEN_BUDGET = 500
+
+# Prompt templates for the small LLM lookups (their hash is part of the cache key)
+GENDER_PROMPT = (
+    "Is the name '{first_name}' typically female? "
+    "Respond with 'True' if it is female, and 'False' if it is male or if the gender of the name is ambiguous."
+)
+MISSION_PROMPT = (
+    "Respond with the mission of the tech company {company}. "
+    "Respond with ONLY the mission of this company in the format 'to __'. Be specific. "
+    "If you are unsure, respond only with 'False'"
+)
+
+PROMPTS = TemplateRegistry(os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts"))
+ROUTER = PromptRouter(ROUTING_RULES, exclusions=ROUTING_EXCLUSIONS, min_fields=ROUTING_MIN_FIELDS)
+EMAIL_PATTERN_INDEX = PatternIndex(os.path.join(os.path.dirname(os.path.abspath(__file__)), EMAIL_PATTERN_FILE))
+SUPPRESSION = SuppressionIndex(os.path.join(os.path.dirname(os.path.abspath(__file__)), SUPPRESSION_FILE))
+ENRICHMENT_EXECUTOR = ThreadPoolExecutor(max_workers=ENRICHMENT_WORKERS, thread_name_prefix='enrich')
+CLIENTS = APIClients(
+    openai_rpm=OPENAI_REQUESTS_PER_MINUTE,
+    openai_tpm=OPENAI_TOKENS_PER_MINUTE,
+    scrapin_rpm=SCRAPIN_REQUESTS_PER_MINUTE,
+    max_retries=API_MAX_RETRIES,
+    pool_size=HTTP_POOL_SIZE,
+    hedge_models={SIMPLE_MODEL},
+)
+PROFILE_ANALYSIS_PROMPT = (
+    "Analyze the LinkedIn profile given by the user and fill in every field of the JSON response.\n"
+    "female: Is the name '{first_name}' typically female? true if it is female, "
+    "false if it is male or if the gender of the name is ambiguous.\n"
+    "mission: The mission of the tech company {company} in the format 'to __'. Be specific. "
+    "If you are unsure or there is no company, use an empty string.\n"
+    "prompt_file: The email template for this person, chosen with these instructions:\n{selection}"
+)
+
+SCRAPE_CACHE = PersistentCache(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), CACHE_DB),
+    'scrapin_responses',
+    max_entries=SCRAPE_CACHE_MAX_ENTRIES,
+    ttls=SCRAPE_CACHE_TTLS,
+)
+LLM_CACHE = PersistentCache(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), CACHE_DB),
+    'llm_lookups',
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    ttls=LLM_CACHE_TTLS,
+)
+COMPANIES = CompanyKnowledgeBase(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), CACHE_DB),
+    'companies',
+    ttl=COMPANY_KB_TTL,
+)
+
 
 class Person:
     """
     A class to store and process information about a person, as extracted from a LinkedIn profile.
     Contains methods to generate email addresses and create a text summary.
+    Uses __slots__ so that large prospect lists stay small in memory; to_dict/from_dict round-trip it.
     """
+    __slots__ = ('first', 'last', 'headline', 'location', 'about', 'domains', 'education', 'current_job',
+                 'past_experience', 'emails', 'female', 'alumni', 'prompt_file')
+
     def __init__(self):
         # Basic personal information
         self.first = ""
@@ -36,11 +225,15 @@ class Person:
         # Boolean flags
         self.female = False
         self.alumni = False
+        # Prompt file suggested by the profile analysis (empty if none)
+        self.prompt_file = ""
 
     class Experience:
         """
         A nested class to represent work experience.
         """
+        __slots__ = ('company', 'title', 'industry', 'description', 'mission')
+
         def __init__(self):
             self.company = ""
             self.title = ""
@@ -48,30 +241,76 @@ class Person:
             self.description = ""
             self.mission = ""
 
+        def to_dict(self):
+            return {name: getattr(self, name) for name in self.__slots__}
+
+        @classmethod
+        def from_dict(cls, data):
+            item = cls()
+            for name in cls.__slots__:
+                if name in data:
+                    setattr(item, name, data[name])
+            return item
+
     class Education:
         """
         A nested class to represent education details.
         """
+        __slots__ = ('school', 'degree', 'field')
+
         def __init__(self):
             self.school = ""
             self.degree = ""
             self.field = ""
 
-    def possible_emails(self, domain, first, last):
+        def to_dict(self):
+            return {name: getattr(self, name) for name in self.__slots__}
+
+        @classmethod
+        def from_dict(cls, data):
+            item = cls()
+            for name in cls.__slots__:
+                if name in data:
+                    setattr(item, name, data[name])
+            return item
+
+    def to_dict(self):
+        """
+        Return the person as a JSON-serializable dict (Person.from_dict reverses it).
+        """
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['domains'] = list(self.domains)
+        data['emails'] = list(self.emails)
+        data['education'] = [item.to_dict() for item in self.education]
+        data['current_job'] = [item.to_dict() for item in self.current_job]
+        data['past_experience'] = [item.to_dict() for item in self.past_experience]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Rebuild a Person from the output of to_dict. Unknown keys are ignored.
+        """
+        person = cls()
+        for name in cls.__slots__:
+            if name in data:
+                setattr(person, name, data[name])
+        person.domains = list(person.domains)
+        person.emails = list(person.emails)
+        person.education = [cls.Education.from_dict(item) for item in person.education]
+        person.current_job = [cls.Experience.from_dict(item) for item in person.current_job]
+        person.past_experience = [cls.Experience.from_dict(item) for item in person.past_experience]
+        return person
+
+    def possible_emails(self, domain, first, last, patterns=None):
         """
         Generate a list of potential email addresses based on the provided domain and person's first/last name.
+        If `patterns` (a list of pattern names) is given, only those patterns are used, in that order.
         """
         try:
-            return [
-                f"{first}.{last}@{domain}",
-                f"{first[0]}{last}@{domain}",
-                f"{first}{last[0]}@{domain}",
-                f"{first}@{domain}",
-                f"{last}@{domain}",
-                f"{first}{last}@{domain}",
-                f"{first}_{last}@{domain}",
-                f"{first}-{last}@{domain}"
-            ]
+            templates = dict(EMAIL_PATTERNS)
+            names = patterns if patterns is not None else [name for name, _ in EMAIL_PATTERNS]
+            return [f"{render_local_part(templates[name], first, last)}@{domain}" for name in names]
         except Exception as e:
             print(f"Error generating possible emails: {e}")
             return []
@@ -79,86 +318,103 @@ class Person:
     def upadate_emails(self):
         """
         Update the person's email list using the domains available.
-        Also adds alumni emails if applicable.
+        Also adds alumni emails if applicable. Domains with confirmed patterns in EMAIL_PATTERN_INDEX
+        only get their top EMAIL_PATTERN_TOP_K patterns, domains with only bounces get the patterns
+        that have not bounced, and unknown domains get every pattern.
         """
         try:
             first, last = self.first.lower(), self.last.lower()
-            for domain in self.domains:
-                self.emails.extend(self.possible_emails(domain, first, last))
-            if self.alumni:
-                self.emails.extend(self.possible_emails('alumni.stanford.edu', first, last))
+            domains = self.domains + (['alumni.stanford.edu'] if self.alumni else [])
+            for domain in domains:
+                patterns = EMAIL_PATTERN_INDEX.top_patterns(domain, EMAIL_PATTERN_TOP_K)
+                self.emails.extend(self.possible_emails(domain, first, last, patterns))
         except Exception as e:
             print(f"Error updating emails: {e}")
 
-    def summary(self):
+    def summary(self, template=None, budget=None):
         """
         Generate a text summary of the person's profile to be used as input for the LLM.
+        With a token `budget`, low-value sections are shortened or dropped to fit it; sections that
+        the prompt `template` refers to are kept first.
         """
         try:
-            output = []
-            # Add basic info if available
-            if self.first:
-                output.append(f"First Name: {self.first}")
-            if self.last:
-                output.append(f"Last Name: {self.last}")
-            if self.headline:
-                output.append(f"Headline: {self.headline}")
-            if self.location:
-                output.append(f"Location: {self.location}")
-            # Gender information based on the flag
-            gender = 'Female' if self.female else 'Male/Unsure'
-            output.append(f"Gender: {gender}")
-            # About section
-            if self.about:
-                output.append(f"About: {self.about}")
-            alumni_status = 'Yes' if self.alumni else 'No'
-            output.append(f"Alumni: {alumni_status}")
-            # Education information
-            if self.education:
-                output.append("Education:")
-                for edu in self.education:
-                    education_info = []
-                    if edu.school:
-                        education_info.append(f"School: {edu.school}")
-                    if edu.degree:
-                        education_info.append(f"Degree: {edu.degree}")
-                    if edu.field:
-                        education_info.append(f"Field: {edu.field}")
-                    if education_info:
-                        output.append(f"  - {', '.join(education_info)}")
-            # Current job information
-            if self.current_job:
-                output.append("Current Experience:")
-                for exp in self.current_job:
-                    current_info = []
-                    if exp.company:
-                        current_info.append(f"Company: {exp.company}")
-                    if exp.title:
-                        current_info.append(f"Title: {exp.title}")
-                    if exp.industry:
-                        current_info.append(f"Industry: {exp.industry}")
-                    if current_info:
-                        output.append(f"  - {', '.join(current_info)}")
-                    if exp.mission:
-                        output.append(f"  - Mission: {exp.mission}")
-            # Past experience information
-            if self.past_experience:
-                output.append("Past Experience:")
-                for exp in self.past_experience:
-                    past_info = []
-                    if exp.company:
-                        past_info.append(f"Company: {exp.company}")
-                    if exp.title:
-                        past_info.append(f"Title: {exp.title}")
-                    if exp.industry:
-                        past_info.append(f"Industry: {exp.industry}")
-                    if past_info:
-                        output.append(f"  - {', '.join(past_info)}")
-            return "\n".join(output)
+            return fit_sections(self.summary_sections(), budget, template)
         except Exception as e:
             print(f"Error generating summary: {e}")
             return ""
 
+    def summary_sections(self):
+        """
+        Return the summary as (field, text) sections in output order, for summary() to fit to a budget.
+        """
+        sections = []
+        # Add basic info if available
+        if self.first:
+            sections.append(('first', f"First Name: {self.first}"))
+        if self.last:
+            sections.append(('last', f"Last Name: {self.last}"))
+        if self.headline:
+            sections.append(('headline', f"Headline: {self.headline}"))
+        if self.location:
+            sections.append(('location', f"Location: {self.location}"))
+        # Gender information based on the flag
+        gender = 'Female' if self.female else 'Male/Unsure'
+        sections.append(('gender', f"Gender: {gender}"))
+        # About section
+        if self.about:
+            sections.append(('about', f"About: {self.about}"))
+        alumni_status = 'Yes' if self.alumni else 'No'
+        sections.append(('alumni', f"Alumni: {alumni_status}"))
+        # Education information
+        if self.education:
+            lines = ["Education:"]
+            for edu in self.education:
+                education_info = []
+                if edu.school:
+                    education_info.append(f"School: {edu.school}")
+                if edu.degree:
+                    education_info.append(f"Degree: {edu.degree}")
+                if edu.field:
+                    education_info.append(f"Field: {edu.field}")
+                if education_info:
+                    lines.append(f"  - {', '.join(education_info)}")
+            sections.append(('education', "\n".join(lines)))
+        # Current job information; each mission is its own section, right after its job
+        if self.current_job:
+            lines = ["Current Experience:"]
+            for exp in self.current_job:
+                current_info = []
+                if exp.company:
+                    current_info.append(f"Company: {exp.company}")
+                if exp.title:
+                    current_info.append(f"Title: {exp.title}")
+                if exp.industry:
+                    current_info.append(f"Industry: {exp.industry}")
+                if current_info:
+                    lines.append(f"  - {', '.join(current_info)}")
+                if exp.mission:
+                    if lines:
+                        sections.append(('current_job', "\n".join(lines)))
+                        lines = []
+                    sections.append(('mission', f"  - Mission: {exp.mission}"))
+            if lines:
+                sections.append(('current_job', "\n".join(lines)))
+        # Past experience information
+        if self.past_experience:
+            lines = ["Past Experience:"]
+            for exp in self.past_experience:
+                past_info = []
+                if exp.company:
+                    past_info.append(f"Company: {exp.company}")
+                if exp.title:
+                    past_info.append(f"Title: {exp.title}")
+                if exp.industry:
+                    past_info.append(f"Industry: {exp.industry}")
+                if past_info:
+                    lines.append(f"  - {', '.join(past_info)}")
+            sections.append(('past_experience', "\n".join(lines)))
+        return sections
+
     def experience_summary(self):
         """
         Generate a summary specifically for work experience.
@@ -180,137 +436,264 @@ class Person:
 
 # Email Automation Functions
 
+_delivery_backend = None
+_delivery_lock = threading.Lock()
+
+def create_delivery_backend(name, path=None):
+    """
+    Create the delivery backend called `name` (see DELIVERY_BACKEND).
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    path = path or DELIVERY_PATH
+    sender = os.getenv('SMTP_FROM') or os.getenv('SMTP_USER')
+    if name == 'applemail':
+        # Locate the BCC AppleScript file relative to this script
+        return AppleMailBackend(os.path.join(script_dir, 'guess_send_email.scpt'))
+    if name == 'smtp':
+        host = os.getenv('SMTP_HOST')
+        if not host:
+            raise EnvironmentError("SMTP_HOST not found in environment variables.")
+        return SMTPBackend(
+            host,
+            int(os.getenv('SMTP_PORT', '587')),
+            username=os.getenv('SMTP_USER'),
+            password=os.getenv('SMTP_PASSWORD'),
+            sender=sender,
+            use_tls=os.getenv('SMTP_TLS', 'true').lower() != 'false',
+            rate_per_minute=SMTP_RATE_PER_MINUTE,
+        )
+    if name == 'eml':
+        return EmlBackend(path, sender)
+    if name == 'mbox':
+        return MboxBackend(path if path.endswith('.mbox') else path + '.mbox', sender)
+    if name == 'null':
+        return NullBackend()
+    raise ValueError(f"Unknown delivery backend '{name}'. Must be 'applemail', 'smtp', 'eml', 'mbox' or 'null'.")
+
+def get_delivery_backend():
+    """
+    Return the shared delivery backend, creating it on first use.
+    """
+    global _delivery_backend
+    with _delivery_lock:
+        if _delivery_backend is None:
+            _delivery_backend = create_delivery_backend(DELIVERY_BACKEND)
+        return _delivery_backend
+
+def close_delivery_backend():
+    """
+    Close the shared delivery backend (e.g. log out of the SMTP server), if one was created.
+    """
+    global _delivery_backend
+    with _delivery_lock:
+        if _delivery_backend is not None:
+            _delivery_backend.close()
+            _delivery_backend = None
+
+@TRACER.traced('send')
 def send_bcc_emails(possible_emails_text, subject, body):
     """
-    Send an email to a list of potential emails using an AppleScript.
+    Send an email to a list of potential emails (comma separated, all in BCC) through the
+    delivery backend. Returns True if the backend accepted the message.
     """
     try:
-        # Locate the BCC AppleScript file relative to this script
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        script_path = os.path.join(script_dir, 'guess_send_email.scpt')
-        if not os.path.exists(script_path):
-            raise FileNotFoundError(f"BCC email script not found: {script_path}")
-        # Execute the AppleScript via subprocess
-        subprocess.check_call(['osascript', script_path, possible_emails_text, subject, body])
+        recipients = [email.strip() for email in possible_emails_text.split(',') if email.strip()]
+        get_delivery_backend().send(recipients, subject, body)
+        return True
     except subprocess.CalledProcessError as e:
         print(f"Error sending BCC emails: {e}")
     except Exception as e:
         print(f"Unexpected error in send_bcc_emails: {e}")
+    return False
 
 # LLM Functions
 
-def compose_message(person_summary, prompt_file):
+def compose_summary(person, prompt_file):
+    """
+    Summary of `person` for composing an email with `prompt_file`, fitted to SUMMARY_TOKEN_BUDGET
+    with the sections that the template refers to kept first.
+    """
+    try:
+        template = PROMPTS.read(prompt_file)
+    except FileNotFoundError:
+        template = None
+    return person.summary(template, SUMMARY_TOKEN_BUDGET)
+
+def build_compose_messages(person_summary, prompt_file):
+    """
+    Build the LLM messages for composing an email: the prompt file followed by the person's summary.
+    """
+    # Read the content of the prompt file (raises FileNotFoundError if it does not exist)
+    prompt_content = PROMPTS.read(prompt_file)
+    # Combine prompt content with the person's summary
+    prompt = prompt_content + "\n\n" + person_summary
+    return [{"role": "user", "content": prompt}]
+
+@TRACER.traced('compose')
+def compose_message(person_summary, prompt_file, stream=None, on_token=None, max_chars=None, max_seconds=None,
+                    stats=None, cancel=None):
     """
     Compose a message by reading a prompt file, appending the person's summary, and sending it to the LLM.
+    With streaming (STREAM_COMPOSE by default), each piece of text is passed to `on_token` as it arrives,
+    and generation is cancelled once it exceeds `max_chars` or `max_seconds` or `cancel` (a Cancellation)
+    is set, returning "". If a `stats` dict is given, it is updated with the streaming timings.
     """
     try:
-        # Ensure the API key is available
-        api_key = os.getenv('OPENAI')
-        if not api_key:
-            raise EnvironmentError("OPENAI API key not found in environment variables.")
-        llm_client = OpenAI(api_key=api_key)
-        print("Person summary for LLM:\n", person_summary)
-        # Check if the prompt file exists
-        if not os.path.exists(prompt_file):
-            raise FileNotFoundError(f"Prompt file '{prompt_file}' does not exist.")
-        # Read the content of the prompt file
-        with open(prompt_file, 'r') as file:
-            prompt_content = file.read()
-        # Combine prompt content with the person's summary
-        prompt = prompt_content + "\n\n" + person_summary
         model = LARGER_MODEL  # The model being used for LLM
-        response = llm_client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        response_message = response.choices[0].message.content
+        messages = build_compose_messages(person_summary, prompt_file)
+        if stream is None:
+            stream = STREAM_COMPOSE
+        if not stream:
+            response = CLIENTS.chat(model, messages, timeout=STAGE_TIMEOUTS['compose'])
+            response_message = response.choices[0].message.content
+            return response_message
+        response_message, stream_stats = stream_completion(model, messages, on_token, max_chars, max_seconds, cancel)
+        if stats is not None:
+            stats.update(stream_stats)
+        if stream_stats["cancelled"] == 'cancelled':
+            return ""
+        if stream_stats["cancelled"]:
+            print(f"Email composition cancelled ({stream_stats['cancelled']}) after {stream_stats['total_time']:.1f}s.")
+            return ""
         return response_message
+    except DeadlineExceeded:
+        print("Email composition ran out of time.")
+        return ""
     except Exception as e:
         print("Error composing message:")
         traceback.print_exc()
         return ""
 
+def stream_completion(model, messages, on_token=None, max_chars=None, max_seconds=None, cancel=None):
+    """
+    Stream a chat completion, passing each piece of text to `on_token` as it arrives.
+    Stops early and closes the connection once the text is longer than `max_chars`, generation
+    has taken longer than `max_seconds`, the current deadline has passed, or `cancel` (a Cancellation)
+    is set from another thread. Returns (text, stats), where stats holds the time to first token,
+    total time, number of characters and the reason for cancelling ('' if it completed).
+    """
+    start = time.monotonic()
+    stats = {"time_to_first_token": None, "total_time": None, "chars": 0, "cancelled": ""}
+    pieces = []
+    left = deadlines.remaining()
+    stream = CLIENTS.chat(model, messages, timeout=max_seconds or STAGE_TIMEOUTS['compose'],
+                          stream=True, stream_options={"include_usage": True})
+    if cancel is not None:
+        # Closing the response stops a stream that is still waiting for its first token
+        cancel.on_cancel(stream.close)
+    try:
+        for chunk in stream:
+            # With include_usage, the last chunk carries the token usage and no choices
+            if getattr(chunk, 'usage', None):
+                TRACER.record_usage(model, chunk.usage)
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            text = chunk.choices[0].delta.content
+            if stats["time_to_first_token"] is None:
+                stats["time_to_first_token"] = time.monotonic() - start
+            pieces.append(text)
+            stats["chars"] += len(text)
+            if on_token:
+                on_token(text)
+            if max_chars and stats["chars"] > max_chars:
+                stats["cancelled"] = "max_chars"
+                break
+            if max_seconds and time.monotonic() - start > max_seconds:
+                stats["cancelled"] = "max_seconds"
+                break
+            if left is not None and time.monotonic() - start > left:
+                stats["cancelled"] = "deadline"
+                break
+            if cancel is not None and cancel.cancelled:
+                break
+    except Exception:
+        if cancel is None or not cancel.cancelled:
+            raise
+    finally:
+        if cancel is not None and cancel.cancelled:
+            stats["cancelled"] = "cancelled"
+        stream.close()
+        stats["total_time"] = time.monotonic() - start
+    return "".join(pieces), stats
+
+def llm_cache_key(value, model, template):
+    """
+    Build the LLM_CACHE key for a lookup: model, hash of the prompt template and the normalized input.
+    Editing a template or switching models therefore never returns stale answers.
+    """
+    normalized = " ".join(value.split()).lower()
+    template_hash = hashlib.sha256(template.encode('utf-8')).hexdigest()[:16]
+    return f"{model}:{template_hash}:{normalized}"
+
+@TRACER.traced('gender')
 def is_female_name(first_name):
     """
     Determine if the given first name is typically female by querying the LLM.
+    Valid answers are memoized in LLM_CACHE.
     """
     try:
-        api_key = os.getenv('OPENAI')
-        if not api_key:
-            raise EnvironmentError("OPENAI API key not found in environment variables.")
-        client = OpenAI(api_key=api_key)
+        cache_key = llm_cache_key(first_name, SIMPLE_MODEL, GENDER_PROMPT)
+        cached = LLM_CACHE.get('gender', cache_key)
+        if cached is not None:
+            return cached
         # System prompt asking if the name is typically female
-        sys_prompt = (
-            f"Is the name '{first_name}' typically female? "
-            "Respond with 'True' if it is female, and 'False' if it is male or if the gender of the name is ambiguous."
-        )
+        sys_prompt = GENDER_PROMPT.format(first_name=first_name)
         model = SIMPLE_MODEL
         system_prompt = {"role": "system", "content": sys_prompt}
-        response = client.chat.completions.create(model=model, messages=[system_prompt])
+        response = CLIENTS.chat(model, [system_prompt], timeout=STAGE_TIMEOUTS['lookup'])
         answer = response.choices[0].message.content.strip().lower()
-        if answer == 'true':
-            return True
-        elif answer == 'false':
-            return False
-        else:
+        if answer not in ('true', 'false'):
             print('Invalid response for gender:', answer)
             return False
+        female = answer == 'true'
+        LLM_CACHE.set('gender', cache_key, female)
+        return female
     except Exception as e:
         print("Error determining gender:")
         traceback.print_exc()
         return False
 
-def get_mission(company):
+@TRACER.traced('mission')
+def get_mission(company, default=''):
     """
     Retrieve the mission of the specified company using the LLM.
+    Answers (including 'unknown', stored as '') are memoized in LLM_CACHE.
+    Returns `default` if the lookup fails (an API error, a timeout or the deadline).
     """
     try:
-        api_key = os.getenv('OPENAI')
-        if not api_key:
-            raise EnvironmentError("OPENAI API key not found in environment variables.")
-        client = OpenAI(api_key=api_key)
+        cache_key = llm_cache_key(company, SIMPLE_MODEL, MISSION_PROMPT)
+        cached = LLM_CACHE.get('mission', cache_key)
+        if cached is not None:
+            return cached
         # System prompt asking for the company's mission in a specific format
-        sys_prompt = (
-            f"Respond with the mission of the tech company {company}. "
-            "Respond with ONLY the mission of this company in the format 'to __'. Be specific. "
-            "If you are unsure, respond only with 'False'"
-        )
+        sys_prompt = MISSION_PROMPT.format(company=company)
         model = SIMPLE_MODEL
         system_prompt = {"role": "system", "content": sys_prompt}
-        response = client.chat.completions.create(model=model, messages=[system_prompt])
+        response = CLIENTS.chat(model, [system_prompt], timeout=STAGE_TIMEOUTS['lookup'])
         answer = response.choices[0].message.content.strip().lower()
-        if answer != 'false':
-            return answer
-        return ''
+        mission = answer if answer != 'false' else ''
+        LLM_CACHE.set('mission', cache_key, mission)
+        return mission
     except Exception as e:
         print(f"Error getting mission for {company}: {e}")
         traceback.print_exc()
-        return ''
+        return default
 
+@TRACER.traced('prompt_llm')
 def get_prompt(person_summary):
     """
     Select a prompt file based on the person's summary using the LLM to choose from available options.
     """
     try:
-        api_key = os.getenv('OPENAI')
-        if not api_key:
-            raise EnvironmentError("OPENAI API key not found in environment variables.")
-        client = OpenAI(api_key=api_key)
-        # Locate the prompt selection file
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        prompt_selection_file = os.path.join(script_dir, "prompts", 'prompt-selection.txt')
-        if not os.path.exists(prompt_selection_file):
-            raise FileNotFoundError(f"Prompt selection file '{prompt_selection_file}' does not exist.")
         # Read the content of the prompt selection file
-        with open(prompt_selection_file, 'r') as file:
-            sys_prompt_content = file.read()
+        sys_prompt_content = PROMPTS.read(PROMPTS.path('prompt-selection.txt'))
         model = SIMPLE_MODEL
         system_prompt = {"role": "system", "content": sys_prompt_content}
         user_prompt = {"role": "user", "content": person_summary}
-        response = client.chat.completions.create(model=model, messages=[system_prompt, user_prompt])
+        response = CLIENTS.chat(model, [system_prompt, user_prompt], timeout=STAGE_TIMEOUTS['lookup'])
         # The answer should be the name of the prompt file (in lowercase)
         answer = response.choices[0].message.content.strip().lower()
-        prompt_file = os.path.join(script_dir, "prompts", answer)
+        prompt_file = PROMPTS.path(answer)
         if not os.path.exists(prompt_file):
             raise FileNotFoundError(f"The prompt file '{prompt_file}' does not exist.")
         return prompt_file
@@ -319,11 +702,214 @@ def get_prompt(person_summary):
         traceback.print_exc()
         raise e
 
+def prewarm_llm_cache(names=(), companies=(), workers=PREWARM_WORKERS):
+    """
+    Run the gender and mission lookups once for every distinct name and company,
+    so that later prospects are served from LLM_CACHE. Already cached inputs cost nothing.
+    """
+    lookups = {}
+    for name in names:
+        lookups.setdefault(('gender', " ".join(name.split()).lower()), (is_female_name, name))
+    for company in companies:
+        lookups.setdefault(('mission', " ".join(company.split()).lower()), (get_mission, company))
+    lookups = [lookup for key, lookup in lookups.items() if key[1]]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda lookup: lookup[0](lookup[1]), lookups))
+    return len(lookups)
+
+def email_prompt_files():
+    """
+    Return the names of the prompt files that can be used to write an email.
+    """
+    return [name for name in PROMPTS.names() if name != 'prompt-selection.txt']
+
+@TRACER.traced('profile_analysis')
+def analyze_profile(person):
+    """
+    Ask the LLM for the person's gender, the mission of their current company and the prompt file
+    to use, in a single JSON-schema-constrained request. Returns the parsed (unvalidated) answer.
+    """
+    company = person.current_job[0].company if person.current_job else ""
+    sys_prompt = PROFILE_ANALYSIS_PROMPT.format(
+        first_name=person.first,
+        company=company or "(none)",
+        selection=PROMPTS.read(PROMPTS.path('prompt-selection.txt')),
+    )
+    schema = {
+        "type": "object",
+        "properties": {
+            "female": {"type": "boolean"},
+            "mission": {"type": "string"},
+            "prompt_file": {"type": "string", "enum": email_prompt_files()},
+        },
+        "required": ["female", "mission", "prompt_file"],
+        "additionalProperties": False,
+    }
+    response = CLIENTS.chat(
+        SIMPLE_MODEL,
+        [{"role": "system", "content": sys_prompt}, {"role": "user", "content": person.experience_summary()}],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "profile_analysis", "strict": True, "schema": schema},
+        },
+        timeout=STAGE_TIMEOUTS['lookup'],
+    )
+    return json.loads(response.choices[0].message.content)
+
+def apply_profile_analysis(person):
+    """
+    Fill in gender, mission and the suggested prompt file from analyze_profile().
+    Fields that are missing or invalid fall back to is_female_name and get_mission
+    (and to the usual prompt selection for the prompt file).
+    """
+    try:
+        analysis = analyze_profile(person)
+        if not isinstance(analysis, dict):
+            raise ValueError(f"Expected a JSON object, got {analysis!r}")
+    except Exception as e:
+        print(f"Error analyzing profile, falling back to individual lookups: {e}")
+        analysis = {}
+    fallbacks = {}
+    female = analysis.get('female')
+    if isinstance(female, bool):
+        person.female = female
+    else:
+        fallbacks['female'] = deadlines.submit(ENRICHMENT_EXECUTOR, is_female_name, person.first)
+    if person.current_job:
+        mission = analysis.get('mission')
+        if isinstance(mission, str) and mission.strip().lower() != 'false':
+            person.current_job[0].mission = mission.strip().lower()
+        else:
+            fallbacks['mission'] = deadlines.submit(ENRICHMENT_EXECUTOR, get_mission, person.current_job[0].company)
+    prompt_file = analysis.get('prompt_file')
+    if isinstance(prompt_file, str) and prompt_file.strip().lower() in email_prompt_files():
+        person.prompt_file = prompt_file.strip().lower()
+    if 'female' in fallbacks:
+        person.female = fallbacks['female'].result()
+    if 'mission' in fallbacks:
+        person.current_job[0].mission = fallbacks['mission'].result()
+
+def local_prompt_file(person):
+    """
+    Return the path of the prompt file that can be chosen without the LLM: the default PROMPT_FILE,
+    the file suggested by the profile analysis or the file picked by confident keyword rules. None otherwise.
+    """
+    if not MULTIPLE_PROMPTS:
+        return PROMPTS.path(PROMPT_FILE)
+    if person.prompt_file:
+        return PROMPTS.path(person.prompt_file)
+    prompt_file, confidence = ROUTER.predict(person)
+    if prompt_file and confidence >= ROUTING_MIN_CONFIDENCE and os.path.exists(PROMPTS.path(prompt_file)):
+        return PROMPTS.path(prompt_file)
+    return None
+
+_last_prompt_file = None
+
+@TRACER.traced('prompt')
+def select_prompt_file(person, person_summary):
+    """
+    Return the path of the prompt file to use: the file from local_prompt_file, or otherwise
+    the file chosen by the LLM.
+    """
+    global _last_prompt_file
+    prompt_file = local_prompt_file(person) or get_prompt(person_summary)
+    _last_prompt_file = prompt_file
+    return prompt_file
+
+# Speculative Composition
+
+SPECULATION_STATS = Counter()   # attempts, hits, saved_seconds, wasted_tokens
+_speculation_lock = threading.Lock()
+
+def speculative_guess(person):
+    """
+    The prompt file to start drafting with before the LLM has chosen one: the keyword rules'
+    best guess (even if not confident), else the last file used. None if there is no guess.
+    """
+    prompt_file, _ = ROUTER.predict(person)
+    if prompt_file and os.path.exists(PROMPTS.path(prompt_file)):
+        return PROMPTS.path(prompt_file)
+    return _last_prompt_file
+
+def compose_speculatively(person, on_token=None, stats=None, stream=None):
+    """
+    Select a prompt file and compose the email, returning (prompt_file, body).
+    With SPECULATIVE_COMPOSE, when the choice needs the LLM, a draft with speculative_guess() is
+    streamed in the background while the LLM chooses. If the guess was right, that draft is kept
+    (its held-back text is then passed to `on_token`); otherwise it is cancelled and the email is
+    composed with the chosen file (streamed according to `stream`). Speculation stops once discarded drafts have used
+    SPECULATION_MAX_WASTED_TOKENS tokens.
+    """
+    selection_summary = person.summary(budget=SUMMARY_TOKEN_BUDGET)
+    guess = None
+    if SPECULATIVE_COMPOSE and local_prompt_file(person) is None:
+        with _speculation_lock:
+            within_budget = SPECULATION_STATS["wasted_tokens"] < SPECULATION_MAX_WASTED_TOKENS
+        guess = speculative_guess(person) if within_budget else None
+    if guess is None:
+        prompt_file = select_prompt_file(person, selection_summary)
+        return prompt_file, compose_message(compose_summary(person, prompt_file), prompt_file,
+                                            stream=stream, on_token=on_token, stats=stats)
+    relay = TokenRelay(on_token)
+    cancellation = Cancellation()
+    draft_stats = {}
+    draft_summary = compose_summary(person, guess)
+    draft = deadlines.submit(ENRICHMENT_EXECUTOR, compose_message, draft_summary, guess, stream=True,
+                             on_token=relay.feed, stats=draft_stats, cancel=cancellation)
+    start = time.monotonic()
+    try:
+        prompt_file = select_prompt_file(person, selection_summary)
+    except BaseException:
+        cancellation.cancel()
+        raise
+    selection_time = time.monotonic() - start
+    if os.path.abspath(prompt_file) == os.path.abspath(guess):
+        relay.confirm()
+        body = draft.result()
+        # The draft started `selection_time` earlier than it otherwise would have
+        saved = min(selection_time, draft_stats.get("total_time") or 0.0)
+        if stats is not None:
+            stats.update(draft_stats)
+        with _speculation_lock:
+            SPECULATION_STATS["attempts"] += 1
+            SPECULATION_STATS["hits"] += 1
+            SPECULATION_STATS["saved_seconds"] += saved
+        TRACER.count("speculation:hit", saved_seconds=saved)
+        return prompt_file, body
+    cancellation.cancel()
+    draft.result()
+    # Tokens billed for the discarded draft: its prompt plus whatever it generated before being cancelled
+    wasted = estimate_tokens(build_compose_messages(draft_summary, guess)) + count_tokens(relay.text())
+    with _speculation_lock:
+        SPECULATION_STATS["attempts"] += 1
+        SPECULATION_STATS["wasted_tokens"] += wasted
+        if SPECULATION_STATS["wasted_tokens"] >= SPECULATION_MAX_WASTED_TOKENS:
+            print("Speculation budget used up; composing without speculation from now on.")
+    TRACER.count("speculation:miss", wasted_tokens=wasted)
+    return prompt_file, compose_message(compose_summary(person, prompt_file), prompt_file,
+                                        stream=stream, on_token=on_token, stats=stats)
+
+def format_speculation_stats():
+    """
+    Format the speculation hit rate, latency saved and tokens spent on discarded drafts for printing.
+    """
+    with _speculation_lock:
+        stats = dict(SPECULATION_STATS)
+    if not stats.get("attempts"):
+        return "no speculative drafts"
+    return (f"{stats.get('hits', 0)}/{stats['attempts']} hits, {stats.get('saved_seconds', 0.0):.1f}s saved, "
+            f"~{stats.get('wasted_tokens', 0)} tokens spent on discarded drafts")
+
 # LinkedIn Scraper Functions
 
+@TRACER.traced('enrich')
 def get_person(data):
     """
     Parse the JSON data from the LinkedIn scraper and populate a Person object.
+    Independent lookups run concurrently on ENRICHMENT_EXECUTOR: the gender lookup and every
+    company lookup start immediately, and the mission lookup starts as soon as the first
+    current job is known. Latency is that of the longest chain (company scrape -> mission).
+    Companies already in the COMPANIES knowledge base cost no request at all.
     """
     try:
         data = data['person']
@@ -334,35 +920,27 @@ def get_person(data):
         person.headline = data.get('headline', '')
         person.location = data.get('location', '')
         person.about = data.get('summary', '')
-        person.female = is_female_name(person.first)
+        # With PROFILE_ANALYSIS, gender and mission come from one request once the jobs are known
+        gender = None if PROFILE_ANALYSIS else deadlines.submit(ENRICHMENT_EXECUTOR, is_female_name, person.first)
         # Limit experience processing to a maximum of 3 entries
         num_exp = data['positions'].get('positionsCount', 0)
         num_exp = num_exp if num_exp < 3 else 3
 
-        # Process work experience entries
+        # Process work experience entries, starting a company scrape for each current one
+        positions = []
         for i in range(num_exp):
             experience = person.Experience()
             exp = data['positions']['positionHistory'][i]
             experience.company = exp.get('companyName', '')
             experience.title = exp.get('title', '')
             experience.description = exp.get('description', '')
-
+            company_lookup = None
+            company_url = exp.get('linkedInUrl', '')
             # If the experience is current (i.e., no end date provided)
             if not exp.get('startEndDate', {}).get('end'):
-                company_data = webscrape(exp.get('linkedInUrl', ''), 'company')
-                if company_data and 'company' in company_data:
-                    company_data = company_data['company']
-                    website = company_data.get('websiteUrl', '')
-                    if website:
-                        person.domains.append(get_domain_from_url(website))
-                    experience.industry = company_data.get('industry', '')
-                    person.current_job.append(experience)
-            else:
-                person.past_experience.append(experience)
+                company_lookup = deadlines.submit(ENRICHMENT_EXECUTOR, get_company, company_url, experience.company)
+            positions.append((experience, company_url, company_lookup))
 
-        # Retrieve mission for the first current job if available
-        if person.current_job:
-            person.current_job[0].mission = get_mission(person.current_job[0].company)
         # Limit education processing to a maximum of 3 entries
         num_ed = data['schools'].get('educationsCount', 0)
         num_ed = num_ed if num_ed < 3 else 3
@@ -380,50 +958,160 @@ def get_person(data):
                 person.alumni = True
             person.education.append(education)
 
+        # Collect company data in profile order
+        mission = None
+        for experience, company_url, company_lookup in positions:
+            if company_lookup is None:
+                person.past_experience.append(experience)
+                continue
+            company = company_lookup.result()
+            if company:
+                if company["domain"]:
+                    person.domains.append(company["domain"])
+                experience.industry = company["industry"]
+                person.current_job.append(experience)
+                # Retrieve mission for the first current job as soon as it is known
+                if mission is None and not PROFILE_ANALYSIS:
+                    mission = deadlines.submit(ENRICHMENT_EXECUTOR, get_company_mission, company_url, experience.company)
+
+        if PROFILE_ANALYSIS:
+            apply_profile_analysis(person)
+            return person
+        if mission is not None:
+            person.current_job[0].mission = mission.result()
+        person.female = gender.result()
         return person
     except Exception as e:
         print("Error parsing person data:")
         traceback.print_exc()
         raise e
 
-def webscrape(linkedin_url, type):
+def fetch_company(linkedin_url):
+    """
+    Scrape a company page and return its domain and industry, {} if Scrapin does not know it
+    (or there is no company page), or None if the request failed and may succeed later.
+    """
+    if not linkedin_url:
+        return {}
+    company_data = webscrape(linkedin_url, 'company', report_not_found=True)
+    if company_data is None:
+        return {}
+    if not company_data or 'company' not in company_data:
+        return None
+    company_data = company_data['company']
+    return {
+        "domain": get_domain_from_url(company_data.get('websiteUrl', '')),
+        "industry": company_data.get('industry', ''),
+    }
+
+def company_key_url(linkedin_url):
+    """
+    Normalize a company's LinkedIn URL for the knowledge base ('' stays '').
+    """
+    return normalize_linkedin_url(linkedin_url) if linkedin_url else ''
+
+def get_company(linkedin_url, name):
+    """
+    Return the domain and industry of a company from the COMPANIES knowledge base, scraping it only
+    the first time it is seen (with REFRESH_CACHE, once more per run). Returns None if the company
+    could not be found.
+    """
+    return COMPANIES.company(company_key_url(linkedin_url), name, lambda: fetch_company(linkedin_url),
+                             refresh=REFRESH_CACHE)
+
+def get_company_mission(linkedin_url, name):
+    """
+    Return the mission of a company from the COMPANIES knowledge base, asking the LLM only once per company.
+    A failed lookup returns '' and is not stored, so the next prospect at the company asks again.
+    """
+    mission = COMPANIES.mission(company_key_url(linkedin_url), name, lambda: get_mission(name, default=None))
+    return mission if mission is not None else ''
+
+def current_companies(profile_data):
+    """
+    Return (LinkedIn URL, name) of the current positions in a profile that get_person enriches, in profile order.
+    """
+    positions = profile_data.get('person', {}).get('positions', {})
+    count = min(positions.get('positionsCount', 0), 3)
+    return [
+        (exp.get('linkedInUrl', ''), exp.get('companyName', ''))
+        for exp in positions.get('positionHistory', [])[:count]
+        if not exp.get('startEndDate', {}).get('end')
+    ]
+
+@TRACER.traced('webscrape')
+def webscrape(linkedin_url, type, report_not_found=False):
     """
     Query the Scrapin API to retrieve data for a given LinkedIn URL.
     The 'type' parameter determines if the query is for 'profile' or 'company' data.
+    Successful responses are cached on disk; REFRESH_CACHE skips the cache lookup.
+    Returns {} on failure. With `report_not_found`, a company that Scrapin reports as
+    not found (400) returns None instead, so callers can tell it apart from a failed request.
     """
     try:
         if type not in ['profile', 'company']:
             raise ValueError("Invalid type for webscrape. Must be 'profile' or 'company'.")
-        url = f"https://api.scrapin.io/enrichment/{type}"
-        api_key = os.getenv('SCRAPIN')
-        if not api_key:
-            raise EnvironmentError("SCRAPIN API key not found in environment variables.")
-        params = {"linkedInUrl": linkedin_url, "apikey": api_key}
-        response = requests.get(url, params=params)
+        cache_key = normalize_linkedin_url(linkedin_url)
+        if not REFRESH_CACHE:
+            cached = SCRAPE_CACHE.get(type, cache_key)
+            if cached is not None:
+                return cached
+        url = f"{SCRAPIN_BASE_URL}/enrichment/{type}"
+        response = CLIENTS.scrapin_get(url, {"linkedInUrl": linkedin_url}, timeout=STAGE_TIMEOUTS['scrape'])
         # Check for successful HTTP response
         if response.status_code == 200:
             # Clean up the response string and decode JSON
             response_string = response.text.strip("()").strip("'")
             try:
                 data = json.loads(response_string)
+                if data:
+                    SCRAPE_CACHE.set(type, cache_key, data)
                 return data
             except json.JSONDecodeError as json_err:
                 print("Error decoding JSON response from scrapin API:", json_err)
                 return {}
         elif response.status_code == 400 and type == 'company':
             print("Company data not found (400).")
-            return {}
+            return None if report_not_found else {}
         else:
             print(f"Request failed with status code: {response.status_code}")
             return {}
     except requests.RequestException as req_err:
         print("Request error during webscrape:", req_err)
         return {}
+    except DeadlineExceeded:
+        print(f"Ran out of time scraping {linkedin_url}.")
+        return {}
     except Exception as e:
         print("Unexpected error in webscrape:")
         traceback.print_exc()
         return {}
 
+def normalize_linkedin_url(url):
+    """
+    Normalize a LinkedIn URL so that variants of the same profile or company share one key.
+    Drops the scheme, query string, fragment and trailing slash, and lowercases the rest.
+    """
+    url = url.strip()
+    if "://" in url:
+        url = url.split("://", 1)[1]
+    url = url.split('#')[0].split('?')[0].rstrip('/')
+    host, _, path = url.partition('/')
+    host = host.lower()
+    # Country subdomains (uk.linkedin.com) and the bare domain all serve the same pages
+    if host == 'linkedin.com' or host.endswith('.linkedin.com'):
+        host = 'www.linkedin.com'
+    return f"https://{host}/{path.lower()}"
+
+def format_cache_stats(cache):
+    """
+    Format a cache's hit/miss counters for printing.
+    """
+    stats = cache.stats()
+    if not stats:
+        return "no lookups"
+    return ", ".join(f"{kind} {counts['hits']} hits/{counts['misses']} misses" for kind, counts in stats.items())
+
 def get_domain_from_url(url):
     """
     Extract the domain from a given URL.
@@ -443,6 +1131,498 @@ def get_domain_from_url(url):
         print("Error extracting domain from URL:", e)
         return ""
 
+def is_valid_linkedin_url(linkedin_url):
+    """
+    Check that the given string looks like a LinkedIn profile URL.
+    """
+    return "https://www.linkedin.com/in/" in linkedin_url
+
+# Suppression Index
+
+def is_suppressed(linkedin_url):
+    """
+    Check whether the prospect at `linkedin_url` was already contacted.
+    """
+    return normalize_linkedin_url(linkedin_url) in SUPPRESSION
+
+def unsuppressed_emails(emails):
+    """
+    Return the addresses in `emails` that were never contacted.
+    """
+    return [email for email in emails if email.lower() not in SUPPRESSION]
+
+def record_contacted(linkedin_url, emails):
+    """
+    Add a contacted prospect's URL and addresses to the suppression index.
+    """
+    SUPPRESSION.add([normalize_linkedin_url(linkedin_url)], 'url')
+    SUPPRESSION.add([email.lower() for email in emails], 'email')
+
+def import_suppression(source):
+    """
+    Merge a list of contacted prospects into the suppression index. Accepts a CSV or newline-delimited
+    file (such as one written by export_suppression); every cell that is a LinkedIn profile URL or an
+    email address is added.
+    """
+    try:
+        urls, emails = [], []
+        with open(source, 'r', newline='') as file:
+            for row in csv.reader(file):
+                for cell in row:
+                    cell = cell.strip()
+                    if "linkedin.com/in/" in cell:
+                        urls.append(normalize_linkedin_url(cell))
+                    elif "@" in cell:
+                        emails.append(cell.lower())
+        added = SUPPRESSION.add(urls, 'url', source) + SUPPRESSION.add(emails, 'email', source)
+        print(f"Imported {added} new entries into the suppression index ({len(SUPPRESSION)} in total).")
+    except Exception as e:
+        print("Error importing the suppression list:")
+        traceback.print_exc()
+
+def export_suppression(path):
+    """
+    Write the suppression index to a CSV file (kind,value) that import_suppression can merge elsewhere.
+    """
+    try:
+        entries = SUPPRESSION.entries()
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['kind', 'value'])
+            writer.writerows(entries)
+        print(f"Exported {len(entries)} suppression entries to {path}.")
+    except Exception as e:
+        print("Error exporting the suppression list:")
+        traceback.print_exc()
+
+# Batch Mode
+
+def read_lines(source):
+    """
+    Read the non-empty lines of a file ('-' reads from stdin).
+    """
+    handle = sys.stdin if source == '-' else open(source, 'r')
+    try:
+        return [line.strip() for line in handle if line.strip()]
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+def read_linkedin_urls(source):
+    """
+    Read LinkedIn URLs from a CSV or newline-delimited file ('-' reads from stdin).
+    Every cell that contains a LinkedIn profile URL is used, in its normalize_linkedin_url form, so that
+    exports with 'linkedin.com/in/...' or 'http://' URLs are not rejected later. Duplicates (trailing
+    slashes, query strings and case do not matter) are dropped, order is kept.
+    """
+    handle = sys.stdin if source == '-' else open(source, 'r', newline='')
+    try:
+        urls = []
+        seen = set()
+        for row in csv.reader(handle):
+            for cell in row:
+                cell = cell.strip()
+                if "linkedin.com/in/" not in cell:
+                    continue
+                url = normalize_linkedin_url(cell)
+                if url not in seen:
+                    seen.add(url)
+                    urls.append(url)
+        return urls
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+@asynccontextmanager
+async def stage_slot(limits, stage):
+    """
+    Hold a slot of `stage` from `limits`. Time spent waiting for the slot is added to the current
+    deadline, so a prospect queued behind others does not run out of time before it starts.
+    """
+    start = time.monotonic()
+    async with limits[stage]:
+        deadlines.postpone(time.monotonic() - start)
+        yield
+
+async def process_prospect(linkedin_url, limits, send, prepare_only=False, journal=None, profile_data=None):
+    """
+    Run one LinkedIn URL through the pipeline (scrape, enrich, prompt, compose, send).
+    Each stage holds its semaphore from `limits` only while its blocking call runs in a worker thread.
+    With `prepare_only`, the pipeline stops before composing and stores the composition request instead.
+    With a `journal`, every completed stage is recorded with its artifacts, and a prospect already
+    in the journal resumes after its last completed stage (nothing is scraped or composed twice).
+    `profile_data` is the profile already fetched by the planning pass ({} if that fetch failed).
+    The prospect has PROSPECT_DEADLINE seconds, not counting time spent waiting for stage slots.
+    Returns a result dict with the draft and the status of the prospect.
+    """
+    result = {
+        "url": linkedin_url,
+        "status": "",
+        "subject": SUBJECT_LINE,
+        "prompt_file": "",
+        "emails": [],
+        "body": "",
+        "error": "",
+    }
+    key = normalize_linkedin_url(linkedin_url)
+    entry = None
+    try:
+        with deadline(PROSPECT_DEADLINE):
+            if not is_valid_linkedin_url(linkedin_url):
+                result["status"] = "invalid_url"
+                return result
+            if journal is not None:
+                entry = await asyncio.to_thread(journal.get, key)
+                if entry:
+                    result["resumed_from"] = entry["stage"]
+            if reached(entry, 'sent'):
+                result.update(prompt_file=os.path.basename(entry["prompt_file"]), body=entry["body"],
+                              emails=entry["emails"], status="already_sent")
+                return result
+            # Never pay for a prospect that was already contacted
+            if await asyncio.to_thread(is_suppressed, linkedin_url):
+                result["status"] = "suppressed"
+                return result
+            if reached(entry, 'enriched'):
+                person = Person.from_dict(entry["person"])
+            else:
+                if reached(entry, 'scraped'):
+                    profile_data = entry["profile"]
+                else:
+                    if profile_data is None:
+                        # Scrape the profile data from LinkedIn using Scrapin
+                        async with stage_slot(limits, 'scrape'):
+                            profile_data = await asyncio.to_thread(webscrape, linkedin_url, 'profile')
+                    if not profile_data:
+                        deadlines.check()
+                        result["status"] = "scrape_failed"
+                        return result
+                    if journal is not None:
+                        await asyncio.to_thread(journal.record, key, 'scraped', profile=profile_data)
+                # Parse and enrich the profile data into a Person object
+                async with stage_slot(limits, 'enrich'):
+                    person = await asyncio.to_thread(get_person, profile_data)
+                # Lookups that ran out of time fall back to defaults; never journal such a Person
+                deadlines.check()
+                if journal is not None:
+                    await asyncio.to_thread(journal.record, key, 'enriched', person=person.to_dict())
+            person_summary = person.summary(budget=SUMMARY_TOKEN_BUDGET)
+            if reached(entry, 'prompt_selected'):
+                prompt_file = entry["prompt_file"]
+            else:
+                async with stage_slot(limits, 'prompt'):
+                    prompt_file = await asyncio.to_thread(select_prompt_file, person, person_summary)
+                if journal is not None:
+                    await asyncio.to_thread(journal.record, key, 'prompt_selected', prompt_file=prompt_file)
+            result["prompt_file"] = os.path.basename(prompt_file)
+            # Fit the summary to the sections the chosen template uses
+            person_summary = compose_summary(person, prompt_file)
+            if prepare_only:
+                person.upadate_emails()
+                result["emails"] = await asyncio.to_thread(unsuppressed_emails, person.emails)
+                if not result["emails"]:
+                    result["status"] = "suppressed" if person.emails else "no_emails"
+                    return result
+                result["request"] = {"model": LARGER_MODEL, "messages": build_compose_messages(person_summary, prompt_file)}
+                result["status"] = "prepared"
+                return result
+            if reached(entry, 'composed'):
+                body = entry["body"]
+            else:
+                # Compose the email message using the LLM
+                compose_stats = {}
+                async with stage_slot(limits, 'compose'):
+                    body = await asyncio.to_thread(
+                        compose_message, person_summary, prompt_file,
+                        max_chars=COMPOSE_MAX_CHARS, max_seconds=COMPOSE_MAX_SECONDS, stats=compose_stats
+                    )
+                if compose_stats:
+                    result["compose"] = compose_stats
+                if not body:
+                    deadlines.check()
+                    result["status"] = "compose_cancelled" if compose_stats.get("cancelled") else "compose_failed"
+                    return result
+                if journal is not None:
+                    await asyncio.to_thread(journal.record, key, 'composed', body=body)
+            result["body"] = body
+            # Update email list based on potential domains, leaving out addresses that were already contacted
+            person.upadate_emails()
+            result["emails"] = await asyncio.to_thread(unsuppressed_emails, person.emails)
+            if not result["emails"]:
+                result["status"] = "suppressed" if person.emails else "no_emails"
+                return result
+            if send:
+                async with stage_slot(limits, 'send'):
+                    sent = await asyncio.to_thread(send_bcc_emails, ",".join(result["emails"]), SUBJECT_LINE, body)
+                result["status"] = "sent" if sent else "send_failed"
+                if sent:
+                    await asyncio.to_thread(record_contacted, linkedin_url, result["emails"])
+                if sent and journal is not None:
+                    await asyncio.to_thread(journal.record, key, 'sent', emails=result["emails"])
+            else:
+                result["status"] = "drafted"
+            return result
+    except DeadlineExceeded:
+        result["status"] = "deadline_exceeded"
+        result["error"] = f"Deadline of {PROSPECT_DEADLINE}s exceeded"
+        return result
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+    finally:
+        if journal is not None and result["status"] not in ("invalid_url", "drafted", "sent", "already_sent", "prepared",
+                                                            "suppressed"):
+            try:
+                await asyncio.to_thread(journal.record_error, key, result["error"] or result["status"])
+            except Exception as e:
+                print(f"Error recording journal entry for {linkedin_url}: {e}")
+
+async def plan_companies(urls, limits, journal=None):
+    """
+    Planning pass for a batch: fetch every profile, collect the distinct companies of their current
+    positions and enrich each one exactly once (domain, industry and, for first current jobs, mission),
+    bounded by the 'scrape' and 'enrich' limits, before anything is composed.
+    Returns the fetched profiles by URL ({} for failed fetches) so the pipeline does not fetch them again.
+    """
+    async def fetch_profile(url):
+        entry = await asyncio.to_thread(journal.get, normalize_linkedin_url(url)) if journal is not None else None
+        if reached(entry, 'enriched') or await asyncio.to_thread(is_suppressed, url):
+            return None
+        if reached(entry, 'scraped'):
+            return entry["profile"]
+        async with limits['scrape']:
+            return await asyncio.to_thread(webscrape, url, 'profile')
+
+    urls = [url for url in urls if is_valid_linkedin_url(url)]
+    fetched = await asyncio.gather(*(fetch_profile(url) for url in urls), return_exceptions=True)
+    profiles = {url: data for url, data in zip(urls, fetched) if isinstance(data, dict)}
+    # key -> (url, name, needs mission); only a profile's first current company gets a mission lookup
+    companies = {}
+    for data in profiles.values():
+        for index, (url, name) in enumerate(current_companies(data)):
+            key = CompanyKnowledgeBase.key(company_key_url(url), name)
+            needs_mission = (index == 0 and not PROFILE_ANALYSIS) or (key in companies and companies[key][2])
+            companies[key] = (url, name, needs_mission)
+
+    async def enrich_company(url, name, needs_mission):
+        async with limits['enrich']:
+            company = await asyncio.to_thread(get_company, url, name)
+            if company and needs_mission:
+                await asyncio.to_thread(get_company_mission, url, name)
+
+    await asyncio.gather(*(enrich_company(*company) for company in companies.values()), return_exceptions=True)
+    print(f"Planned {len(companies)} distinct companies across {len(profiles)} profiles. "
+          f"Company knowledge base: {format_cache_stats(COMPANIES)}")
+    return profiles
+
+async def run_batch(urls, output_path, stage_limits, send=False, prepare_only=False, journal=None,
+                    prefetch_companies=None):
+    """
+    Process a list of LinkedIn URLs concurrently, bounded per stage by `stage_limits`.
+    Results are written to `output_path` as JSON lines in completion order.
+    Progress is recorded in `journal` (a CampaignJournal), if given, so a rerun resumes where this one stopped.
+    With `prefetch_companies` (default BATCH_PREFETCH_COMPANIES), plan_companies runs first.
+    Returns a Counter of statuses.
+    """
+    loop = asyncio.get_running_loop()
+    # Every stage slot may be blocked in a worker thread at the same time
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=sum(stage_limits.values())))
+    limits = {stage: asyncio.Semaphore(limit) for stage, limit in stage_limits.items()}
+    if prefetch_companies is None:
+        prefetch_companies = BATCH_PREFETCH_COMPANIES
+    profiles = await plan_companies(urls, limits, journal) if prefetch_companies else {}
+    counts = Counter()
+    with open(output_path, 'w') as out:
+        tasks = [
+            asyncio.create_task(process_prospect(url, limits, send, prepare_only, journal, profiles.pop(url, None)))
+            for url in urls
+        ]
+        for finished, task in enumerate(asyncio.as_completed(tasks), start=1):
+            result = await task
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            counts[result["status"]] += 1
+            print(f"[{finished}/{len(urls)}] {result['status']}: {result['url']}")
+    return counts
+
+def batch_main(source, output_path, stage_limits, send, journal_path=JOURNAL_FILE):
+    """
+    Entry point for batch mode: read URLs, run the pipeline and print a status summary.
+    Progress is journaled in `journal_path` (None disables the journal).
+    """
+    journal = None
+    try:
+        urls = read_linkedin_urls(source)
+        if not urls:
+            print("No LinkedIn URLs found in input.")
+            return
+        if journal_path:
+            journal = CampaignJournal(journal_path)
+            stages = journal.counts()
+            if stages:
+                print(f"Resuming from journal {journal_path}: " + ", ".join(f"{stage} {count}" for stage, count in stages.items()))
+        print(f"Processing {len(urls)} LinkedIn URLs (stage limits: {stage_limits})")
+        counts = asyncio.run(run_batch(urls, output_path, stage_limits, send, journal=journal))
+        summary = ", ".join(f"{status}: {count}" for status, count in counts.most_common())
+        print(f"Batch complete. {summary}. Results written to {output_path}")
+        print(f"Scrapin cache: {format_cache_stats(SCRAPE_CACHE)}")
+        print(f"LLM lookup cache: {format_cache_stats(LLM_CACHE)}")
+        print(f"Company knowledge base: {format_cache_stats(COMPANIES)}")
+    except Exception as e:
+        print("An error occurred in batch mode:")
+        traceback.print_exc()
+    finally:
+        if journal is not None:
+            journal.close()
+
+# Bulk Mode (OpenAI Batch API)
+
+def get_bulk_backend(name, job_dir):
+    """
+    Return the batch backend called `name`: 'openai' for the Batch API, 'local' for the offline stand-in.
+    """
+    if name == 'local':
+        return LocalBatchBackend(os.path.join(job_dir, 'local_batches'))
+    return OpenAIBatchBackend(CLIENTS.openai)
+
+def read_json_lines(path):
+    """
+    Read a JSON lines file into a list of dicts.
+    """
+    with open(path, 'r') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def bulk_submit(source, job_dir, stage_limits, backend_name='openai'):
+    """
+    Prepare every prospect up to composition, then submit all compositions as one batch job.
+    Progress is kept in `job_dir`: prepared prospects in manifest.jsonl, the job id in job.json.
+    Running it again resumes from there instead of scraping or submitting twice.
+    """
+    try:
+        os.makedirs(job_dir, exist_ok=True)
+        job_path = os.path.join(job_dir, 'job.json')
+        if os.path.exists(job_path):
+            with open(job_path, 'r') as file:
+                job = json.load(file)
+            print(f"Batch job {job['job_id']} was already submitted. Collect it with --bulk-collect {job_dir}")
+            return
+        manifest_path = os.path.join(job_dir, 'manifest.jsonl')
+        if not os.path.exists(manifest_path):
+            urls = read_linkedin_urls(source)
+            if not urls:
+                print("No LinkedIn URLs found in input.")
+                return
+            print(f"Preparing {len(urls)} LinkedIn URLs for bulk composition (stage limits: {stage_limits})")
+            # Only a complete manifest is renamed into place, so an interrupted run starts over
+            asyncio.run(run_batch(urls, manifest_path + '.partial', stage_limits, prepare_only=True))
+            os.replace(manifest_path + '.partial', manifest_path)
+        manifest = read_json_lines(manifest_path)
+        requests_by_id = {
+            f"prospect-{index}": item["request"]
+            for index, item in enumerate(manifest) if item["status"] == "prepared"
+        }
+        if not requests_by_id:
+            print("No prospects were prepared; nothing to submit.")
+            return
+        requests_path = os.path.join(job_dir, 'requests.jsonl')
+        write_batch_requests(requests_path, requests_by_id)
+        backend = get_bulk_backend(backend_name, job_dir)
+        job_id = backend.submit(requests_path)
+        with open(job_path, 'w') as file:
+            json.dump({"job_id": job_id, "backend": backend.name, "submitted_at": time.time()}, file)
+        print(f"Submitted batch job {job_id} with {len(requests_by_id)} emails. "
+              f"Collect the drafts with --bulk-collect {job_dir}")
+    except Exception as e:
+        print("An error occurred while submitting the batch job:")
+        traceback.print_exc()
+
+def bulk_collect(job_dir, output_path, send=False, poll_interval=BULK_POLL_SECONDS):
+    """
+    Wait for the batch job in `job_dir` to finish, map its drafts back to the prospects in the
+    manifest and write them to `output_path` (and send them with `send`).
+    """
+    try:
+        with open(os.path.join(job_dir, 'job.json'), 'r') as file:
+            job = json.load(file)
+        backend = get_bulk_backend(job["backend"], job_dir)
+        status = backend.status(job["job_id"])
+        while status not in TERMINAL_STATUSES:
+            print(f"Batch job {job['job_id']} is {status}; checking again in {poll_interval}s (safe to interrupt).")
+            time.sleep(poll_interval)
+            status = backend.status(job["job_id"])
+        if status != 'completed':
+            print(f"Batch job {job['job_id']} ended with status '{status}'.")
+            return
+        drafts = parse_batch_output(backend.results(job["job_id"]))
+        counts = Counter()
+        with open(output_path, 'w') as out:
+            for index, item in enumerate(read_json_lines(os.path.join(job_dir, 'manifest.jsonl'))):
+                item.pop("request", None)
+                if item["status"] == "prepared":
+                    body = drafts.get(f"prospect-{index}")
+                    if not body:
+                        item["status"] = "compose_failed"
+                    else:
+                        item["body"] = body
+                        if not send:
+                            item["status"] = "drafted"
+                        elif is_suppressed(item["url"]) or not unsuppressed_emails(item["emails"]):
+                            # Contacted by another run since the job was submitted
+                            item["status"] = "suppressed"
+                        elif send_bcc_emails(",".join(unsuppressed_emails(item["emails"])), item["subject"], body):
+                            item["status"] = "sent"
+                            record_contacted(item["url"], item["emails"])
+                        else:
+                            item["status"] = "send_failed"
+                out.write(json.dumps(item) + "\n")
+                counts[item["status"]] += 1
+        summary = ", ".join(f"{status}: {count}" for status, count in counts.most_common())
+        print(f"Batch job {job['job_id']} collected. {summary}. Results written to {output_path}")
+    except Exception as e:
+        print("An error occurred while collecting the batch job:")
+        traceback.print_exc()
+
+def import_addresses(source):
+    """
+    Teach EMAIL_PATTERN_INDEX from a CSV of known addresses with a header row:
+    first,last,email and an optional outcome column ('delivered' or 'bounced', default delivered).
+    """
+    try:
+        matched = unmatched = 0
+        with open(source, 'r', newline='') as file:
+            for row in csv.DictReader(file):
+                delivered = (row.get('outcome') or 'delivered').strip().lower() != 'bounced'
+                pattern = EMAIL_PATTERN_INDEX.record_address(
+                    (row.get('email') or '').strip(), (row.get('first') or '').strip(),
+                    (row.get('last') or '').strip(), delivered
+                )
+                if pattern:
+                    matched += 1
+                else:
+                    unmatched += 1
+        EMAIL_PATTERN_INDEX.save()
+        print(f"Imported {matched} addresses into the email pattern index ({unmatched} did not match a pattern).")
+    except Exception as e:
+        print("Error importing addresses:")
+        traceback.print_exc()
+
+def parse_stage_limits(overrides, concurrency=None):
+    """
+    Build the per-stage limits from BATCH_STAGE_LIMITS, a global --concurrency and STAGE=N overrides.
+    """
+    stage_limits = dict(BATCH_STAGE_LIMITS)
+    if concurrency:
+        for stage in stage_limits:
+            if stage != 'send':
+                stage_limits[stage] = concurrency
+    for override in overrides or []:
+        stage, _, value = override.partition('=')
+        if stage not in stage_limits or not value.isdigit() or int(value) < 1:
+            raise ValueError(f"Invalid stage limit '{override}'. Expected STAGE=N with STAGE in {list(stage_limits)}.")
+        stage_limits[stage] = int(value)
+    return stage_limits
+
 # Main Loop
 
 def main():
@@ -459,48 +1639,174 @@ def main():
                 print("Empty input, please enter a valid LinkedIn URL.")
                 continue
             # Validate the LinkedIn URL format
-            if "https://www.linkedin.com/in/" not in linkedin_url:
+            if not is_valid_linkedin_url(linkedin_url):
                 print("Invalid LinkedIn URL. Please enter a valid LinkedIn URL. Example: https://linkedin.com/in/janedoe")
                 continue
-            # Scrape the profile data from LinkedIn using Scrapin
-            profile_data = webscrape(linkedin_url, 'profile')
-            if not profile_data:
-                print("Failed to retrieve profile data. Please check the URL or try again later.")
-                continue
-            # Parse the profile data into a Person object
-            person = get_person(profile_data)
-            person_summary = person.summary()
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            # Determine which prompt file to use (multiple prompts vs. a default prompt)
-            if MULTIPLE_PROMPTS:
-                prompt_file = get_prompt(person_summary)
-            else:
-                prompt_file = os.path.join(script_dir, "prompts", PROMPT_FILE)
-            subject = SUBJECT_LINE
-            # Compose the email message using the LLM
-            body = compose_message(person_summary, prompt_file)
-            if not body:
-                print("Failed to compose email message. Aborting email sending.")
-                continue
-            # Update email list based on potential domains
-            person.upadate_emails()
-            if not person.emails:
-                print("No possible emails generated. Aborting.")
-                continue
-            possible_emails_text = ",".join(person.emails)
-            # Send the email using the BCC email script
-            send_bcc_emails(possible_emails_text, subject, body)
-            print("Email composed successfully")
+            try:
+                with deadline(PROSPECT_DEADLINE):
+                    # Skip prospects that were already contacted before paying for anything
+                    if is_suppressed(linkedin_url):
+                        print("This prospect was already contacted (see the suppression index). Skipping.")
+                        continue
+                    # Scrape the profile data from LinkedIn using Scrapin
+                    profile_data = webscrape(linkedin_url, 'profile')
+                    if not profile_data:
+                        print("Failed to retrieve profile data. Please check the URL or try again later.")
+                        continue
+                    # Parse the profile data into a Person object
+                    person = get_person(profile_data)
+                    deadlines.check()
+                    print("Person summary for LLM:\n", person.summary(budget=SUMMARY_TOKEN_BUDGET))
+                    subject = SUBJECT_LINE
+                    # Determine which prompt file to use (multiple prompts vs. a default prompt) and
+                    # compose the email message using the LLM, speculatively overlapping the two if enabled
+                    if STREAM_COMPOSE:
+                        stats = {}
+                        print("\nDraft:")
+                        prompt_file, body = compose_speculatively(
+                            person, on_token=lambda text: print(text, end='', flush=True), stats=stats
+                        )
+                        if stats.get("time_to_first_token") is not None:
+                            print(f"\n\nTime to first token: {stats['time_to_first_token']:.2f}s, "
+                                  f"total generation: {stats['total_time']:.2f}s")
+                    else:
+                        prompt_file, body = compose_speculatively(person)
+                    if SPECULATIVE_COMPOSE:
+                        print(f"Speculation: {format_speculation_stats()}")
+                    if not body:
+                        deadlines.check()
+                        print("Failed to compose email message. Aborting email sending.")
+                        continue
+                    # Update email list based on potential domains
+                    person.upadate_emails()
+                    if not person.emails:
+                        print("No possible emails generated. Aborting.")
+                        continue
+                    emails = unsuppressed_emails(person.emails)
+                    if not emails:
+                        print("Every possible email was already contacted. Aborting.")
+                        continue
+                    possible_emails_text = ",".join(emails)
+                    # Send the email using the BCC email script
+                    if send_bcc_emails(possible_emails_text, subject, body):
+                        record_contacted(linkedin_url, emails)
+                    print("Email composed successfully")
+            except DeadlineExceeded:
+                print(f"Ran out of time for this prospect (PROSPECT_DEADLINE is {PROSPECT_DEADLINE}s).")
     except Exception as e:
         print("An error occurred in the main loop:")
         traceback.print_exc()
 
 # Entry Point
 
+def parse_args():
+    """
+    Parse command line arguments. Without --batch the tool runs interactively.
+    """
+    parser = argparse.ArgumentParser(description="The Cold Emailing Automation Tool")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="CSV or newline-delimited file of LinkedIn URLs ('-' reads from stdin)")
+    parser.add_argument('--output', default=BATCH_OUTPUT_FILE,
+                        help="JSON lines file for batch drafts and per-URL status")
+    parser.add_argument('--concurrency', type=int,
+                        help="In-flight prospects for every batch stage except send")
+    parser.add_argument('--stage-limit', action='append', metavar='STAGE=N',
+                        help="In-flight prospects for one batch stage (scrape, enrich, prompt, compose, send)")
+    parser.add_argument('--send', action='store_true',
+                        help="Deliver each batch draft through the delivery backend instead of only writing it to --output")
+    parser.add_argument('--journal', default=JOURNAL_FILE,
+                        help="SQLite file recording batch progress per prospect; rerunning a batch resumes from it")
+    parser.add_argument('--no-journal', action='store_true',
+                        help="Run the batch without reading or writing the journal")
+    parser.add_argument('--delivery', choices=['applemail', 'smtp', 'eml', 'mbox', 'null'],
+                        help="Delivery backend (default: DELIVERY_BACKEND)")
+    parser.add_argument('--delivery-path',
+                        help="Directory for the 'eml' backend or file for the 'mbox' backend (default: DELIVERY_PATH)")
+    parser.add_argument('--profile-analysis', action='store_true',
+                        help="Get gender, mission and prompt file from one LLM request per profile")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream the email draft as it is generated and report time to first token")
+    parser.add_argument('--speculate', action='store_true',
+                        help="Start drafting with the most likely prompt file while the LLM chooses one")
+    parser.add_argument('--deadline', type=float, metavar='SECONDS',
+                        help="Seconds of work allowed per prospect (default: PROSPECT_DEADLINE; 0 for no deadline)")
+    parser.add_argument('--hedge', action='store_true',
+                        help="Send a duplicate of Scrapin and SIMPLE_MODEL requests slower than their p95 latency")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="Append timing spans, token usage, cache hits and retries to FILE as JSON lines")
+    parser.add_argument('--profile', action='store_true',
+                        help="Print p50/p95 latency per stage and token/cost totals per model when done")
+    parser.add_argument('--refresh', action='store_true',
+                        help="Ignore cached Scrapin responses and fetch them again")
+    parser.add_argument('--bulk-submit', metavar='FILE',
+                        help="Prepare the LinkedIn URLs in FILE and submit their emails as one OpenAI batch job")
+    parser.add_argument('--bulk-collect', metavar='DIR',
+                        help="Wait for the batch job in DIR and write its drafts to --output")
+    parser.add_argument('--job-dir', default=BULK_JOB_DIR,
+                        help="Directory that keeps the state of a --bulk-submit job")
+    parser.add_argument('--local-batch', action='store_true',
+                        help="Use the offline stand-in instead of the OpenAI Batch API")
+    parser.add_argument('--poll-interval', type=float, default=BULK_POLL_SECONDS,
+                        help="Seconds between status checks in --bulk-collect")
+    parser.add_argument('--import-addresses', metavar='FILE',
+                        help="CSV (first,last,email[,outcome]) of delivered or bounced addresses to learn email patterns from")
+    parser.add_argument('--import-suppression', metavar='FILE',
+                        help="Merge a CSV or newline-delimited list of contacted LinkedIn URLs and emails into the suppression index")
+    parser.add_argument('--export-suppression', metavar='FILE',
+                        help="Write the suppression index to FILE as CSV")
+    parser.add_argument('--prewarm-names', metavar='FILE',
+                        help="Newline-delimited first names to look up and cache before running")
+    parser.add_argument('--prewarm-companies', metavar='FILE',
+                        help="Newline-delimited company names to look up and cache before running")
+    return parser.parse_args()
+
 if __name__ == '__main__':
+    args = parse_args()
+    REFRESH_CACHE = args.refresh
+    PROFILE_ANALYSIS = PROFILE_ANALYSIS or args.profile_analysis
+    STREAM_COMPOSE = STREAM_COMPOSE or args.stream
+    SPECULATIVE_COMPOSE = SPECULATIVE_COMPOSE or args.speculate
+    DELIVERY_BACKEND = args.delivery or DELIVERY_BACKEND
+    DELIVERY_PATH = args.delivery_path or DELIVERY_PATH
+    if args.deadline is not None:
+        PROSPECT_DEADLINE = args.deadline or None
+    if HEDGE_REQUESTS or args.hedge:
+        CLIENTS.hedger = Hedger(HEDGE_PERCENTILE, max_fraction=HEDGE_MAX_FRACTION)
     try:
         # Load environment variables from a .env file if present
         load_dotenv()
     except Exception as e:
         print("Error loading environment variables:", e)
-    main()
\ No newline at end of file
+    if args.import_addresses:
+        import_addresses(args.import_addresses)
+    if args.import_suppression:
+        import_suppression(args.import_suppression)
+    if args.export_suppression:
+        export_suppression(args.export_suppression)
+    if args.prewarm_names or args.prewarm_companies:
+        names = read_lines(args.prewarm_names) if args.prewarm_names else []
+        companies = read_lines(args.prewarm_companies) if args.prewarm_companies else []
+        count = prewarm_llm_cache(names, companies)
+        print(f"Pre-warmed {count} LLM lookups. {format_cache_stats(LLM_CACHE)}")
+    try:
+        stage_limits = parse_stage_limits(args.stage_limit, args.concurrency)
+    except ValueError as e:
+        sys.exit(str(e))
+    if args.trace:
+        TRACER.open(args.trace)
+    try:
+        if args.batch:
+            batch_main(args.batch, args.output, stage_limits, args.send, None if args.no_journal else args.journal)
+        elif args.bulk_submit:
+            bulk_submit(args.bulk_submit, args.job_dir, stage_limits, 'local' if args.local_batch else 'openai')
+        elif args.bulk_collect:
+            bulk_collect(args.bulk_collect, args.output, args.send, args.poll_interval)
+        elif not (args.prewarm_names or args.prewarm_companies or args.import_addresses
+                  or args.import_suppression or args.export_suppression):
+            main()
+    finally:
+        close_delivery_backend()
+        SUPPRESSION.close()
+        TRACER.close()
+        if args.profile:
+            print("\n" + TRACER.summary(MODEL_PRICES))
\ No newline at end of file
@@ -0,0 +1,370 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from email import message_from_bytes
+import socketserver
+import threading
+import random
+import zlib
+import copy
+import json
+import math
+import time
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Speaks just enough SMTP (EHLO/HELO, AUTH, MAIL, RCPT, DATA, RSET, NOOP, QUIT) for smtplib.
+    """
+    def reply(self, line):
+        self.wfile.write(line.encode('utf-8') + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 localhost SMTP stand-in ready")
+        mail_from, rcpt_to = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb, _, argument = command.partition(' ')
+            verb = verb.upper()
+            if verb == 'EHLO':
+                self.wfile.write(b"250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif verb == 'HELO':
+                self.reply("250 localhost")
+            elif verb == 'AUTH':
+                with server.lock:
+                    server.logins += 1
+                self.reply("235 Authentication successful")
+            elif verb == 'MAIL':
+                mail_from, rcpt_to = argument.partition(':')[2].strip().strip('<>').split('>')[0], []
+                self.reply("250 OK")
+            elif verb == 'RCPT':
+                rcpt_to.append(argument.partition(':')[2].strip().strip('<>').split('>')[0])
+                self.reply("250 OK")
+            elif verb == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                    # Undo dot-stuffing
+                    lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                with server.lock:
+                    server.messages.append({
+                        "mail_from": mail_from,
+                        "rcpt_to": rcpt_to,
+                        "message": message_from_bytes(b"".join(lines)),
+                    })
+                mail_from, rcpt_to = None, []
+                self.reply("250 OK: queued")
+            elif verb == 'RSET':
+                mail_from, rcpt_to = None, []
+                self.reply("250 OK")
+            elif verb == 'NOOP':
+                self.reply("250 OK")
+            elif verb == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    A local SMTP stand-in that accepts every message and keeps it in `messages`,
+    for testing the SMTP delivery backend without a real mail server.
+    Use as a context manager; `port` is chosen automatically.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _SMTPHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+FIRST_NAMES = [
+    "Alex", "Priya", "Sam", "Maria", "James", "Wei", "Fatima", "Daniel", "Sofia", "Kenji",
+    "Emily", "Omar", "Grace", "Lucas", "Aisha", "Noah", "Chloe", "Mateo", "Hannah", "Ravi",
+]
+
+DRAFT = (
+    "Hi {name},\n\n"
+    "My name is Jane Doe and I'm a senior at Stanford studying Computer Science. "
+    "I'm a builder and an aspiring founder.\n\n"
+    "I saw you were at your current company and I would love to hear about your journey so far, "
+    "in particular how you think about building great teams and finding the right partners. "
+    "I appreciate your time and I know it is valuable. If you are interested, you can book a quick "
+    "meeting at your leisure at calendly.com/janedoe.\n\nWarmly,\nJane"
+)
+
+
+def slug_index(url):
+    """
+    Stable number for the last path segment of a LinkedIn URL (its trailing digits, if any).
+    """
+    slug = urlparse(url).path.rstrip('/').split('/')[-1]
+    digits = ''.join(character for character in slug if character.isdigit())
+    return int(digits) if digits else zlib.crc32(slug.encode('utf-8'))
+
+
+class _MockAPIHandler(BaseHTTPRequestHandler):
+    """
+    Routes Scrapin GET /enrichment/{profile,company} and OpenAI POST /v1/chat/completions.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def injected_error(self):
+        """
+        Reply with an injected 429 or 500 if the dice say so. Returns True if it replied.
+        """
+        status = self.server.roll_error()
+        if status:
+            self.send_json(status, {"error": {"message": f"Injected {status} from the mock server", "code": status}})
+            return True
+        return False
+
+    def do_GET(self):
+        server = self.server
+        parsed = urlparse(self.path)
+        kind = parsed.path.rstrip('/').split('/')[-1]
+        if not parsed.path.startswith('/enrichment/') or kind not in ('profile', 'company'):
+            self.send_json(404, {"error": "not found"})
+            return
+        server.count(kind)
+        time.sleep(server.sample_latency(kind))
+        if self.injected_error():
+            return
+        linkedin_url = parse_qs(parsed.query).get('linkedInUrl', [''])[0]
+        payload = server.profile(linkedin_url) if kind == 'profile' else server.company(linkedin_url)
+        self.send_json(200, payload)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_json(404, {"error": {"message": "not found"}})
+            return
+        kind, content = server.answer(request)
+        server.count(kind)
+        prompt_tokens = sum(len(message.get('content') or '') for message in request.get('messages', [])) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+        }
+        latency = server.sample_latency(kind)
+        if not request.get('stream'):
+            time.sleep(latency)
+            if self.injected_error():
+                return
+            self.send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get('model', ''),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            })
+            return
+        # Streamed responses: the first token arrives after 30% of the latency, the rest spread over the remainder
+        time.sleep(latency * 0.3)
+        if self.injected_error():
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        pieces = [word + ' ' for word in content.split(' ')]
+        pieces[-1] = pieces[-1].rstrip(' ')
+        delay = latency * 0.7 / max(1, len(pieces))
+        try:
+            for piece in pieces:
+                self.write_event({"choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]},
+                                 request)
+                time.sleep(delay)
+            if (request.get('stream_options') or {}).get('include_usage'):
+                self.write_event({"choices": [], "usage": usage}, request)
+            self.write_chunk(b"data: [DONE]\n\n")
+            self.write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the stream
+            self.close_connection = True
+
+    def write_event(self, payload, request):
+        payload = dict(payload, id="chatcmpl-mock", object="chat.completion.chunk",
+                       created=int(time.time()), model=request.get('model', ''))
+        self.write_chunk(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    """
+    A local stand-in for the Scrapin enrichment endpoints and the OpenAI chat completions endpoint.
+    Profiles and companies are served from recorded fixtures, varied per URL so that every synthetic
+    prospect has its own name and one of `companies` employers. Each request sleeps for a latency drawn
+    from a log-normal distribution with the mean given in `latencies` (seconds per request kind:
+    profile, company, chat, compose) and spread `latency_sigma`; a share of requests fails with
+    429 (`rate_limit_rate`) or 500 (`error_rate`). Use as a context manager.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, profiles, company, companies=50, latencies=None, latency_sigma=0.5,
+                 error_rate=0.0, rate_limit_rate=0.0, seed=None, host='127.0.0.1', port=0):
+        super().__init__((host, port), _MockAPIHandler)
+        self.profiles = profiles
+        self.company_fixture = company
+        self.companies = max(1, companies)
+        self.latencies = dict({'profile': 0.5, 'company': 0.3, 'chat': 0.4, 'compose': 3.0}, **(latencies or {}))
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count(self, kind):
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def sample_latency(self, kind):
+        """
+        Draw a latency for a request of `kind`; the log-normal is scaled so its mean is the configured one.
+        """
+        mean = self.latencies.get(kind, 0.0)
+        if mean <= 0:
+            return 0.0
+        with self._lock:
+            draw = self._random.lognormvariate(0.0, self.latency_sigma)
+        return mean * draw / math.exp(self.latency_sigma ** 2 / 2)
+
+    def roll_error(self):
+        """
+        Return 429 or 500 for a request that should fail, or None.
+        """
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+    def profile(self, linkedin_url):
+        """
+        Return a profile fixture personalised for the prospect at `linkedin_url`.
+        """
+        index = slug_index(linkedin_url)
+        payload = copy.deepcopy(self.profiles[index % len(self.profiles)])
+        person = payload["person"]
+        person["firstName"] = FIRST_NAMES[index % len(FIRST_NAMES)]
+        person["lastName"] = f"Prospect{index}"
+        person["publicIdentifier"] = urlparse(linkedin_url).path.rstrip('/').split('/')[-1]
+        for position in person["positions"]["positionHistory"]:
+            if not (position.get("startEndDate") or {}).get("end"):
+                company = index % self.companies
+                position["companyName"] = f"{position['companyName']} {company}"
+                position["linkedInUrl"] = f"https://www.linkedin.com/company/mock-company-{company}/"
+        return payload
+
+    def company(self, linkedin_url):
+        """
+        Return the company fixture personalised for the company at `linkedin_url`.
+        """
+        index = slug_index(linkedin_url)
+        payload = copy.deepcopy(self.company_fixture)
+        payload["company"]["name"] = f"Mock Company {index}"
+        payload["company"]["universalName"] = f"mock-company-{index}"
+        payload["company"]["linkedInUrl"] = linkedin_url
+        payload["company"]["websiteUrl"] = f"https://www.mock-company-{index}.example.com/"
+        return payload
+
+    def answer(self, request):
+        """
+        Return (kind, content) for a chat completion request, recognising the tool's own prompts.
+        """
+        messages = request.get('messages', [])
+        text = " ".join(message.get('content') or '' for message in messages)
+        response_format = request.get('response_format') or {}
+        if response_format.get('type') == 'json_schema':
+            schema = response_format['json_schema']['schema']
+            prompt_files = schema['properties']['prompt_file'].get('enum') or ['other.txt']
+            return 'chat', json.dumps({"female": False, "mission": "to help teams build better software",
+                                       "prompt_file": prompt_files[-1]})
+        if 'typically female' in text:
+            return 'chat', 'False'
+        if 'mission of the tech company' in text:
+            return 'chat', 'to help teams build better software'
+        if messages and messages[0].get('role') == 'system' and 'file name' in text:
+            return 'chat', 'other.txt'
+        first_name = ''
+        for line in text.splitlines():
+            if line.startswith('First Name:'):
+                first_name = line.split(':', 1)[1].strip()
+                break
+        return 'compose', DRAFT.format(name=first_name or 'there')
@@ -0,0 +1,79 @@
+import re
+
+
+class PromptRouter:
+    """
+    Picks a prompt file from a person's headline, current job titles and current industries
+    using keyword rules, without calling the LLM.
+    `rules` maps a prompt file name to its keywords. Every keyword found in a field adds that
+    field's weight to the prompt file's score. Keywords match whole words (plural 's' allowed).
+    `exclusions` maps a prompt file name to phrases that stop a field from counting for it
+    (e.g. 'investor relations' for a VC template). A prompt file only reaches full confidence when
+    its keywords match in at least `min_fields` fields, so one field cannot decide on its own.
+    """
+    def __init__(self, rules, field_weights=None, min_score=3.0, exclusions=None, min_fields=2):
+        self.field_weights = field_weights or {'title': 3.0, 'headline': 2.0, 'industry': 2.0}
+        self.min_score = min_score
+        self.min_fields = min_fields
+        self.patterns = {
+            prompt_file: [self._pattern(keyword) for keyword in keywords]
+            for prompt_file, keywords in rules.items()
+        }
+        self.exclusions = {
+            prompt_file: [self._pattern(phrase) for phrase in phrases]
+            for prompt_file, phrases in (exclusions or {}).items()
+        }
+
+    @staticmethod
+    def _pattern(keyword):
+        """
+        Compile a keyword into a whole-word pattern (plural 's' allowed).
+        """
+        return re.compile(r'\b' + re.escape(keyword.lower()) + r's?\b')
+
+    def fields(self, person):
+        """
+        Return (field, text) pairs from the parts of the profile the rules look at.
+        """
+        fields = [('headline', person.headline or '')]
+        for exp in person.current_job:
+            fields.append(('title', exp.title or ''))
+            fields.append(('industry', exp.industry or ''))
+        return [(field, text.lower()) for field, text in fields if text]
+
+    def matches(self, person):
+        """
+        Return the score of every prompt file for this person and the number of fields that matched it.
+        """
+        scores = {prompt_file: 0.0 for prompt_file in self.patterns}
+        fields = {prompt_file: 0 for prompt_file in self.patterns}
+        for field, text in self.fields(person):
+            weight = self.field_weights.get(field, 1.0)
+            for prompt_file, patterns in self.patterns.items():
+                if any(pattern.search(text) for pattern in self.exclusions.get(prompt_file, [])):
+                    continue
+                hits = sum(1 for pattern in patterns if pattern.search(text))
+                scores[prompt_file] += weight * hits
+                fields[prompt_file] += 1 if hits else 0
+        return scores, fields
+
+    def scores(self, person):
+        """
+        Return the score of every prompt file for this person.
+        """
+        return self.matches(person)[0]
+
+    def predict(self, person):
+        """
+        Return (prompt_file, confidence) for the best scoring prompt file.
+        Confidence is its share of all matched weight, scaled down while its score is below min_score
+        and while fewer than min_fields fields matched it; it is 0.0 (and prompt_file None) when nothing matched.
+        """
+        scores, fields = self.matches(person)
+        total = sum(scores.values())
+        if not total:
+            return None, 0.0
+        prompt_file = max(scores, key=scores.get)
+        best = scores[prompt_file]
+        agreement = min(1.0, fields[prompt_file] / self.min_fields)
+        return prompt_file, (best / total) * min(1.0, best / self.min_score) * agreement
@@ -0,0 +1,76 @@
+import threading
+
+
+class Cancellation:
+    """
+    A flag that one thread sets to stop work running in another. Callbacks registered with
+    on_cancel() run once it is set (immediately if it already is), e.g. to close a stream.
+    """
+    def __init__(self):
+        self.cancelled = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def on_cancel(self, callback):
+        """
+        Call `callback` when cancel() is called.
+        """
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        """
+        Set the flag and run the registered callbacks.
+        """
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error while cancelling: {e}")
+
+
+class TokenRelay:
+    """
+    Holds back the text of a speculative draft until confirm(), then passes the held text and
+    everything after it to `on_token` as it arrives.
+    """
+    def __init__(self, on_token=None):
+        self.on_token = on_token
+        self.pieces = []
+        self.confirmed = False
+        self._lock = threading.Lock()
+
+    def feed(self, text):
+        """
+        Take a piece of the draft (the on_token callback of the speculative composition).
+        """
+        # on_token runs under the lock so that held text is always delivered first
+        with self._lock:
+            self.pieces.append(text)
+            if self.confirmed and self.on_token:
+                self.on_token(text)
+
+    def confirm(self):
+        """
+        Release the held text to `on_token` and pass later pieces straight through.
+        """
+        with self._lock:
+            self.confirmed = True
+            held = "".join(self.pieces)
+            if held and self.on_token:
+                self.on_token(held)
+
+    def text(self):
+        """
+        Everything received so far.
+        """
+        with self._lock:
+            return "".join(self.pieces)
@@ -0,0 +1,115 @@
+import functools
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# How much each summary section is worth to the email, before looking at the template
+BASE_PRIORITY = {
+    'first': 100,
+    'last': 90,
+    'current_job': 80,
+    'headline': 70,
+    'mission': 60,
+    'alumni': 50,
+    'gender': 50,
+    'education': 40,
+    'past_experience': 30,
+    'location': 20,
+    'about': 10,
+}
+TEMPLATE_BONUS = 100                  # Added to the priority of sections the template refers to
+REQUIRED_SECTIONS = {'first', 'last', 'current_job'}
+TRUNCATABLE_SECTIONS = {'about'}      # Long free text that is shortened before it is dropped
+MIN_TRUNCATED_TOKENS = 24             # Shorter than this, a truncated section is dropped instead
+
+# Words in a template that show it uses a section
+FIELD_KEYWORDS = {
+    'headline': ['headline'],
+    'location': ['location', 'based in', 'city'],
+    'gender': ['woman', 'women', 'female', 'gender'],
+    'about': ['about section', 'about me', 'bio', 'interests', 'passion'],
+    'alumni': ['alumn'],
+    'education': ['school', 'studied', 'degree', 'education', 'alumn'],
+    'current_job': ['company', 'role', 'title', 'firm'],
+    'mission': ['mission'],
+    'past_experience': ['past', 'previous', 'worked at'],
+}
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    """
+    The tiktoken encoding used to count tokens, or None if tiktoken is unavailable.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding('o200k_base')
+    except Exception:
+        # The encoding is downloaded on first use, which fails offline
+        return None
+
+
+def count_tokens(text):
+    """
+    Count the tokens in `text` with tiktoken if installed, otherwise estimate about four characters per token.
+    """
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def truncate_tokens(text, max_tokens):
+    """
+    Cut `text` to at most `max_tokens` tokens, at a word boundary, marking the cut with '...'.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _encoding()
+    if encoding is not None:
+        cut = encoding.decode(encoding.encode(text)[:max(0, max_tokens - 1)])
+    else:
+        cut = text[:max(0, max_tokens - 1) * 4]
+    return cut.rsplit(' ', 1)[0].rstrip(' ,.;:') + '...'
+
+
+def template_fields(template):
+    """
+    Return the summary sections a prompt template refers to.
+    """
+    template = template.lower()
+    return {field for field, keywords in FIELD_KEYWORDS.items() if any(keyword in template for keyword in keywords)}
+
+
+def fit_sections(sections, budget=None, template=None):
+    """
+    Join summary `sections` ((field, text) pairs, in output order) into one text of at most `budget`
+    tokens. Sections are ranked by BASE_PRIORITY, raised for the fields `template` refers to; the
+    lowest ranked are shortened (free text) or dropped first. Required sections are always kept.
+    """
+    if budget is None:
+        return "\n".join(text for _, text in sections)
+    used = template_fields(template) if template else set()
+    ranks = {field: BASE_PRIORITY.get(field, 0) + (TEMPLATE_BONUS if field in used else 0) for field, _ in sections}
+    kept = list(sections)
+    tokens = [count_tokens(text) for _, text in kept]
+    # One extra token per line break
+    total = sum(tokens) + len(kept)
+    for index in sorted(range(len(sections)), key=lambda i: ranks[sections[i][0]]):
+        if total <= budget:
+            break
+        field, text = sections[index]
+        if field in REQUIRED_SECTIONS:
+            continue
+        allowed = tokens[index] - (total - budget)
+        if field in TRUNCATABLE_SECTIONS and allowed >= MIN_TRUNCATED_TOKENS:
+            kept[index] = (field, truncate_tokens(text, allowed))
+            total -= tokens[index] - count_tokens(kept[index][1])
+        else:
+            kept[index] = None
+            total -= tokens[index] + 1
+    return "\n".join(section[1] for section in kept if section is not None)
@@ -0,0 +1,221 @@
+import threading
+import hashlib
+import sqlite3
+import math
+import time
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter: `in` never misses an added value and is wrong for about
+    `error_rate` of the values that were not added, as long as it holds at most `capacity` values.
+    """
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        """
+        Bit positions of `value`, from two 64-bit halves of one hash (double hashing).
+        """
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class SuppressionIndex:
+    """
+    Persistent set of prospects that were already contacted: normalized LinkedIn URLs and email
+    addresses, stored in SQLite. A Bloom filter in memory answers most lookups (every value that
+    was never added) without touching the disk; only possible matches are confirmed in SQLite.
+    The filter is saved with the set on close() and after bulk additions, so that opening a large
+    index does not rehash every entry. Entries that other processes (another session, the daemon,
+    an import) add later are picked up before a Bloom miss is trusted, using SQLite's data_version.
+    Callers normalize values before passing them in. One instance can be shared between threads.
+    """
+    BULK_SAVE_THRESHOLD = 1000   # Save the filter after adding at least this many values at once
+
+    def __init__(self, path, capacity=1000000, error_rate=0.001):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom = None
+        self._last_rowid = 0       # Highest row already in the filter
+        self._data_version = None  # PRAGMA data_version when the filter was last synced
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        """
+        Open the database and fill the Bloom filter on first use. Caller must hold the lock.
+        """
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS suppressed ("
+                "value TEXT PRIMARY KEY, kind TEXT NOT NULL, source TEXT, added_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS bloom_filter ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), capacity INTEGER NOT NULL, error_rate REAL NOT NULL, "
+                "entries INTEGER NOT NULL, bits BLOB NOT NULL)"
+            )
+            self._conn.commit()
+            if not self._load_filter():
+                self._rebuild()
+            self._data_version = self._version()
+        return self._conn
+
+    def _version(self):
+        """
+        SQLite's data_version: it changes whenever another connection commits. Caller must hold the lock.
+        """
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _max_rowid(self):
+        """
+        Highest rowid in the set (0 when empty). Caller must hold the lock.
+        """
+        return self._conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM suppressed").fetchone()[0]
+
+    def _sync(self):
+        """
+        Add the entries other connections stored since the filter was last synced. Caller must hold the lock.
+        """
+        for rowid, value in self._conn.execute(
+                "SELECT rowid, value FROM suppressed WHERE rowid > ? ORDER BY rowid", (self._last_rowid,)):
+            self._bloom.add(value)
+            self._last_rowid = rowid
+        if self._bloom.count > self.capacity:
+            self._rebuild()
+        self._data_version = self._version()
+
+    def _load_filter(self):
+        """
+        Load the saved filter if it still covers exactly the stored set. Caller must hold the lock.
+        """
+        saved = self._conn.execute("SELECT capacity, error_rate, entries, bits FROM bloom_filter").fetchone()
+        if saved is None or saved[1] != self.error_rate:
+            return False
+        total = self._conn.execute("SELECT COUNT(*) FROM suppressed").fetchone()[0]
+        # Entries are never removed, so an unchanged count means no other process added any
+        if saved[2] != total or total * 2 > saved[0]:
+            return False
+        self.capacity = saved[0]
+        self._bloom = BloomFilter(self.capacity, self.error_rate)
+        self._bloom.bits = bytearray(saved[3])
+        self._bloom.count = total
+        self._last_rowid = self._max_rowid()
+        return True
+
+    def _save_filter(self):
+        """
+        Save the filter next to the set it covers. Caller must hold the lock.
+        """
+        total = self._conn.execute("SELECT COUNT(*) FROM suppressed").fetchone()[0]
+        self._conn.execute(
+            "INSERT OR REPLACE INTO bloom_filter (id, capacity, error_rate, entries, bits) VALUES (0, ?, ?, ?, ?)",
+            (self.capacity, self.error_rate, total, bytes(self._bloom.bits))
+        )
+        self._conn.commit()
+
+    def _rebuild(self):
+        """
+        Refill the Bloom filter from the database, growing it if it is over capacity. Caller must hold the lock.
+        """
+        total = self._conn.execute("SELECT COUNT(*) FROM suppressed").fetchone()[0]
+        while total * 2 > self.capacity:
+            self.capacity *= 2
+        self._bloom = BloomFilter(self.capacity, self.error_rate)
+        self._last_rowid = 0
+        for rowid, value in self._conn.execute("SELECT rowid, value FROM suppressed"):
+            self._bloom.add(value)
+            self._last_rowid = max(self._last_rowid, rowid)
+
+    def __contains__(self, value):
+        with self._lock:
+            try:
+                conn = self._connection()
+                if value not in self._bloom:
+                    # Only trust a miss once the filter covers what other processes have added
+                    if self._version() == self._data_version:
+                        return False
+                    self._sync()
+                    if value not in self._bloom:
+                        return False
+                return conn.execute("SELECT 1 FROM suppressed WHERE value = ?", (value,)).fetchone() is not None
+            except sqlite3.Error as e:
+                print(f"Error reading the suppression index: {e}")
+                return False
+
+    def add(self, values, kind, source=''):
+        """
+        Add values of `kind` ('url' or 'email'). Returns the number of values that were new.
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connection()
+                # Hold the write lock while catching up, so no other writer's rows fall between the
+                # synced rows and ours
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._sync()
+                    before = conn.total_changes
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO suppressed (value, kind, source, added_at) VALUES (?, ?, ?, ?)",
+                        [(value, kind, source, now) for value in values]
+                    )
+                    last_rowid = self._max_rowid()
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+                self._last_rowid = last_rowid
+                added = conn.total_changes - before
+                for value in values:
+                    self._bloom.add(value)
+                if self._bloom.count > self.capacity:
+                    self._rebuild()
+                if len(values) >= self.BULK_SAVE_THRESHOLD:
+                    self._save_filter()
+                return added
+            except sqlite3.Error as e:
+                print(f"Error writing to the suppression index: {e}")
+                return 0
+
+    def entries(self):
+        """
+        Return every (kind, value) pair, ordered by kind and value.
+        """
+        with self._lock:
+            conn = self._connection()
+            return conn.execute("SELECT kind, value FROM suppressed ORDER BY kind, value").fetchall()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM suppressed").fetchone()[0]
+
+    def close(self):
+        """
+        Save the filter and close the underlying database connection.
+        """
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._save_filter()
+                except sqlite3.Error as e:
+                    print(f"Error saving the suppression filter: {e}")
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,54 @@
+import threading
+import os
+
+
+class TemplateRegistry:
+    """
+    Prompt templates loaded once from a directory and kept in memory.
+    A template is re-read from disk only when its file's modification time changes.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._templates = {}   # absolute path -> (mtime, content)
+        self._lock = threading.Lock()
+        self.load_all()
+
+    def load_all(self):
+        """
+        Load every .txt template in the directory.
+        """
+        for name in self.names():
+            self.read(self.path(name))
+
+    def names(self):
+        """
+        Return the file names of the templates currently in the directory.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.txt'))
+
+    def path(self, name):
+        """
+        Return the absolute path of the template called `name`.
+        """
+        return os.path.abspath(os.path.join(self.directory, name))
+
+    def read(self, path):
+        """
+        Return the content of the template at `path`, reloading it if the file changed.
+        """
+        path = os.path.abspath(path)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Prompt file '{path}' does not exist.")
+        with self._lock:
+            cached = self._templates.get(path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        with open(path, 'r') as file:
+            content = file.read()
+        with self._lock:
+            self._templates[path] = (mtime, content)
+        return content
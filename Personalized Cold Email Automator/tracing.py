@@ -0,0 +1,155 @@
+from collections import defaultdict, Counter
+from contextlib import contextmanager
+import functools
+import threading
+import json
+import math
+import time
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers (0.0 for an empty list).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100.0 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+class Tracer:
+    """
+    Records wall-time spans per stage, token usage per model and event counters (cache hits,
+    retries, ...). Everything is aggregated in memory for summary(); if a trace file is open,
+    every record is also appended to it as a JSON line.
+    """
+    def __init__(self):
+        self.durations = defaultdict(list)   # stage -> [seconds]
+        self.usage = defaultdict(Counter)    # model -> requests / prompt_tokens / completion_tokens
+        self.counters = Counter()            # event name -> count
+        self._file = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """
+        Forget everything recorded so far (the trace file stays open).
+        """
+        with self._lock:
+            self.durations.clear()
+            self.usage.clear()
+            self.counters.clear()
+
+    def open(self, path):
+        """
+        Start appending every record to the JSON lines file at `path`.
+        """
+        with self._lock:
+            self._file = open(path, 'a')
+
+    def close(self):
+        """
+        Close the trace file, if one is open.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, record):
+        """
+        Append a record to the trace file. Caller must hold the lock.
+        """
+        if self._file is not None:
+            record["time"] = time.time()
+            record["thread"] = threading.current_thread().name
+            self._file.write(json.dumps(record) + "\n")
+
+    @contextmanager
+    def span(self, stage, **fields):
+        """
+        Time the enclosed block as one call of `stage`.
+        """
+        start = time.monotonic()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            duration = time.monotonic() - start
+            with self._lock:
+                self.durations[stage].append(duration)
+                self._write(dict(fields, type="span", stage=stage, duration=duration, ok=ok))
+
+    def traced(self, stage):
+        """
+        Decorator that records every call of the function as a span of `stage`.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record_usage(self, model, usage):
+        """
+        Record the `usage` object of an OpenAI response for `model`.
+        """
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+        with self._lock:
+            counts = self.usage[model]
+            counts["requests"] += 1
+            counts["prompt_tokens"] += prompt_tokens
+            counts["completion_tokens"] += completion_tokens
+            self._write({
+                "type": "usage",
+                "model": model,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+            })
+
+    def count(self, name, **fields):
+        """
+        Count one occurrence of the event `name` (e.g. a cache hit or a retry).
+        """
+        with self._lock:
+            self.counters[name] += 1
+            self._write(dict(fields, type="event", name=name))
+
+    def summary(self, prices=None):
+        """
+        Return a text report with p50/p95 latency per stage, token and cost totals per model
+        (using `prices`: model -> (input, output) dollars per million tokens) and event counts.
+        """
+        prices = prices or {}
+        with self._lock:
+            lines = [f"{'Stage':<22}{'Calls':>7}{'p50 (s)':>10}{'p95 (s)':>10}{'Total (s)':>11}"]
+            for stage, durations in sorted(self.durations.items()):
+                lines.append(
+                    f"{stage:<22}{len(durations):>7}{percentile(durations, 50):>10.3f}"
+                    f"{percentile(durations, 95):>10.3f}{sum(durations):>11.2f}"
+                )
+            lines.append("")
+            lines.append(f"{'Model':<22}{'Requests':>9}{'Prompt tok':>12}{'Output tok':>12}{'Cost ($)':>10}")
+            total_cost = 0.0
+            for model, counts in sorted(self.usage.items()):
+                input_price, output_price = prices.get(model, (0.0, 0.0))
+                cost = (counts["prompt_tokens"] * input_price + counts["completion_tokens"] * output_price) / 1e6
+                total_cost += cost
+                lines.append(
+                    f"{model:<22}{counts['requests']:>9}{counts['prompt_tokens']:>12}"
+                    f"{counts['completion_tokens']:>12}{cost:>10.4f}"
+                )
+            lines.append(f"{'Total':<55}{total_cost:>10.4f}")
+            if self.counters:
+                lines.append("")
+                lines.append("Events: " + ", ".join(f"{name} {count}" for name, count in sorted(self.counters.items())))
+            return "\n".join(lines)
+
+
+TRACER = Tracer()